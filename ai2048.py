@@ -0,0 +1,276 @@
+import argparse
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard2048
+from bitboard2048 import DIRECTIONS, move_board, pack_grid
+
+# Chance nodes that are less likely than this are scored by the heuristic
+# instead of being searched further
+MIN_PROBABILITY = 0.0001
+
+# Heuristic weights (empty cells and possible merges are good, rows that are
+# not monotonic and large tile sums are bad)
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+
+def row_heuristic(row):
+    tiles = [(row >> (4 * i)) & 0xF for i in range(4)]
+    total = sum(tile ** SUM_POWER for tile in tiles)
+    empty = tiles.count(0)
+    merges = 0
+    prev = 0
+    counter = 0
+    for tile in tiles:
+        if tile == 0:
+            continue
+        if prev == tile:
+            counter += 1
+        elif counter > 0:
+            merges += 1 + counter
+            counter = 0
+        prev = tile
+    if counter > 0:
+        merges += 1 + counter
+    left = right = 0.0
+    for i in range(3):
+        a = tiles[i] ** MONOTONICITY_POWER
+        b = tiles[i + 1] ** MONOTONICITY_POWER
+        if tiles[i] > tiles[i + 1]:
+            left += a - b
+        else:
+            right += b - a
+    return (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges
+            - MONOTONICITY_WEIGHT * min(left, right) - SUM_WEIGHT * total)
+
+
+class TranspositionTable:
+    # Bounded board -> (depth, value) cache that evicts the least recently used entry
+    def __init__(self, max_size=500000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def get(self, board, depth):
+        self.lookups += 1
+        entry = self.entries.get(board)
+        if entry is not None and entry[0] >= depth:
+            self.entries.move_to_end(board)
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def put(self, board, depth, value):
+        self.entries[board] = (depth, value)
+        self.entries.move_to_end(board)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class SearchTimeout(Exception):
+    # Raised out of a search that ran past its deadline
+    pass
+
+
+class ExpectimaxSearch:
+    def __init__(self, table_size=500000):
+        bitboard2048.build_tables()
+        self.table = TranspositionTable(table_size)
+        # Row heuristics are cached per packed row, so there are at most 65536
+        self.row_scores = {}
+        self.nodes = 0
+        # perf_counter() time at which a search gives up with SearchTimeout,
+        # checked every 256 nodes; None searches to the end
+        self.deadline = None
+
+    def heuristic(self, board):
+        row_scores = self.row_scores
+        score = 0.0
+        transposed = bitboard2048.transpose(board)
+        for b in (board, transposed):
+            for shift in (0, 16, 32, 48):
+                row = (b >> shift) & 0xFFFF
+                value = row_scores.get(row)
+                if value is None:
+                    value = row_scores[row] = row_heuristic(row)
+                score += value
+        return score
+
+    def max_node(self, board, depth, probability):
+        self.nodes += 1
+        best = 0.0
+        for direction in DIRECTIONS:
+            new_board = move_board(board, direction)[0]
+            if new_board != board:
+                best = max(best, self.chance_node(new_board, depth, probability))
+        return best
+
+    def chance_node(self, board, depth, probability):
+        self.nodes += 1
+        if self.nodes & 0xFF == 0 and self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        if depth <= 0 or probability < MIN_PROBABILITY:
+            return self.heuristic(board)
+        cached = self.table.get(board, depth)
+        if cached is not None:
+            return cached
+        empty = bitboard2048.empty_cells(board)
+        probability /= len(empty)
+        total = 0.0
+        for i in empty:
+            shift = 4 * i
+            total += 0.9 * self.max_node(board | (1 << shift), depth - 1, probability * 0.9)
+            total += 0.1 * self.max_node(board | (2 << shift), depth - 1, probability * 0.1)
+        value = total / len(empty)
+        self.table.put(board, depth, value)
+        return value
+
+    def score_move(self, board, direction, depth):
+        new_board = move_board(board, direction)[0]
+        if new_board == board:
+            return None
+        return self.chance_node(new_board, depth, 1.0)
+
+
+# One search per worker process, so its tables survive between calls
+_worker_search = None
+
+
+def _score_with(search, board, direction, depth, deadline=None):
+    # Returns (direction, value, nodes, cache hits, cache lookups) for one root
+    # move. Raises SearchTimeout once deadline has passed; the table only ever
+    # holds values of finished subtrees, so it stays valid.
+    nodes, hits, lookups = search.nodes, search.table.hits, search.table.lookups
+    search.deadline = deadline
+    try:
+        value = search.score_move(board, direction, depth)
+    finally:
+        search.deadline = None
+    return (direction, value, search.nodes - nodes,
+            search.table.hits - hits, search.table.lookups - lookups)
+
+
+def _score_root_move(board, direction, depth, time_left=None):
+    # The deadline is sent as seconds left, clocks of other processes may differ
+    global _worker_search
+    if _worker_search is None:
+        _worker_search = ExpectimaxSearch()
+    deadline = None if time_left is None else time.perf_counter() + time_left
+    return _score_with(_worker_search, board, direction, depth, deadline)
+
+
+class ExpectimaxAI:
+    def __init__(self, max_depth=6, workers=None, table_size=500000):
+        self.max_depth = max_depth
+        self.search = ExpectimaxSearch(table_size)
+        # workers > 1 scores the root moves in parallel on a process pool
+        self.pool = ProcessPoolExecutor(workers) if workers and workers > 1 else None
+        self.stats = {"nodes": 0, "seconds": 0.0, "hits": 0, "lookups": 0, "depth": 0}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def score_root(self, board, depth, deadline=None):
+        # Raises SearchTimeout when deadline passes before every move is scored
+        if self.pool is None:
+            results = [_score_with(self.search, board, d, depth, deadline) for d in DIRECTIONS]
+        else:
+            time_left = None if deadline is None else deadline - time.perf_counter()
+            futures = [self.pool.submit(_score_root_move, board, d, depth, time_left) for d in DIRECTIONS]
+            try:
+                results = [future.result() for future in futures]
+            finally:
+                # Don't leave the other moves of an abandoned depth running
+                for future in futures:
+                    future.cancel()
+        scores = {}
+        for direction, value, nodes, hits, lookups in results:
+            self.stats["nodes"] += nodes
+            self.stats["hits"] += hits
+            self.stats["lookups"] += lookups
+            if value is not None:
+                scores[direction] = value
+        return scores
+
+    def best_move(self, game, time_budget=0.1):
+        # Iterative deepening within time_budget seconds. A depth that runs past
+        # the budget is abandoned and the move of the last finished depth is
+        # played; depth 1 always finishes, so there is a move even on a tiny
+        # budget. Returns None when no move is possible.
+        board = game.board if hasattr(game, "board") else pack_grid(game.grid)
+        start = time.perf_counter()
+        deadline = start + time_budget
+        best = None
+        for depth in range(1, self.max_depth + 1):
+            depth_start = time.perf_counter()
+            try:
+                scores = self.score_root(board, depth, deadline if depth > 1 else None)
+            except SearchTimeout:
+                break
+            if not scores:
+                break
+            best = max(scores, key=scores.get)
+            self.stats["depth"] = depth
+            now = time.perf_counter()
+            # Every extra level costs several times the previous one, don't
+            # start one that would only be abandoned
+            if (now - start) + 4 * (now - depth_start) > time_budget:
+                break
+        self.stats["seconds"] += time.perf_counter() - start
+        return best
+
+    def report(self):
+        seconds = self.stats["seconds"] or 1e-9
+        lookups = self.stats["lookups"] or 1
+        return (f"{self.stats['nodes'] / seconds:,.0f} nodes/sec, "
+                f"{100 * self.stats['hits'] / lookups:.1f}% cache hits, depth {self.stats['depth']}")
+
+
+_default_ai = None
+
+
+def best_move(game, time_budget=0.1):
+    global _default_ai
+    if _default_ai is None:
+        _default_ai = ExpectimaxAI()
+    return _default_ai.best_move(game, time_budget)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Let the expectimax AI play a game of 2048")
+    parser.add_argument("--budget", type=float, default=0.1, help="seconds per move")
+    parser.add_argument("--depth", type=int, default=6, help="maximum search depth")
+    parser.add_argument("--workers", type=int, default=1, help="processes for the root search")
+    args = parser.parse_args()
+
+    game = bitboard2048.BitboardGame2048()
+    ai = ExpectimaxAI(max_depth=args.depth, workers=args.workers)
+    moves = 0
+    try:
+        while not game.check_game_over():
+            game.move(ai.best_move(game, args.budget))
+            moves += 1
+            if moves % 100 == 0:
+                print(f"{moves} moves, score {game.score}, {ai.report()}")
+    finally:
+        ai.close()
+    print(f"Game over after {moves} moves. Score: {game.score}, "
+          f"max tile: {bitboard2048.max_tile(game.board)}")
+    print(ai.report())
+
+
+if __name__ == "__main__":
+    main()
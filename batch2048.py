@@ -0,0 +1,158 @@
+import numpy as np
+
+import bitboard2048
+
+# Moves are passed as integer codes, in the order of bitboard2048.DIRECTIONS
+LEFT, RIGHT, UP, DOWN = range(4)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+_ROW_LEFT = None
+_ROW_SCORE = None
+
+
+def _tables():
+    # Share the 65536-entry row tables with the bitboard engine
+    global _ROW_LEFT, _ROW_SCORE
+    if _ROW_LEFT is None:
+        bitboard2048.build_tables()
+        _ROW_LEFT = np.array(bitboard2048.ROW_LEFT, dtype=np.uint16)
+        _ROW_SCORE = np.array(bitboard2048.ROW_SCORE, dtype=np.int64)
+    return _ROW_LEFT, _ROW_SCORE
+
+
+def _next_random(state):
+    # splitmix64 step on every board at once, returns the new state and output
+    state = state + _GOLDEN
+    z = state
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return state, z ^ (z >> np.uint64(31))
+
+
+def _orient(boards, direction):
+    # View every board so that the requested move becomes a slide to the left
+    if direction == RIGHT:
+        return boards[:, :, ::-1]
+    if direction == UP:
+        return boards.transpose(0, 2, 1)
+    if direction == DOWN:
+        return boards.transpose(0, 2, 1)[:, :, ::-1]
+    return boards
+
+
+def _unorient(boards, direction):
+    # Inverse of _orient, maps the slid view back onto the real boards
+    if direction == DOWN:
+        return boards[:, :, ::-1].transpose(0, 2, 1)
+    return _orient(boards, direction)
+
+
+def slide_left(boards):
+    # Slide (N, 4, 4) exponent boards to the left, returns (new_boards, scores)
+    row_left, row_score = _tables()
+    rows = boards.astype(np.uint16)
+    keys = rows[:, :, 0] | (rows[:, :, 1] << 4) | (rows[:, :, 2] << 8) | (rows[:, :, 3] << 12)
+    slid = row_left[keys]
+    new_boards = np.empty_like(boards)
+    for c in range(4):
+        new_boards[:, :, c] = (slid >> (4 * c)) & 0xF
+    return new_boards, row_score[keys].sum(axis=1)
+
+
+class BatchGame2048:
+    # Steps many 2048 boards at once; boards hold log2 exponents (0 = empty)
+    def __init__(self, count, seed=None, seeds=None):
+        if seeds is None:
+            seeds = np.random.SeedSequence(seed).generate_state(count, dtype=np.uint64)
+        self.rng_state = np.array(seeds, dtype=np.uint64).reshape(count)
+        self.boards = np.zeros((count, 4, 4), dtype=np.uint8)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.moves = np.zeros(count, dtype=np.int64)
+        self.game_over = np.zeros(count, dtype=bool)
+        everyone = np.ones(count, dtype=bool)
+        self.add_new_tiles(everyone)
+        self.add_new_tiles(everyone)
+
+    def __len__(self):
+        return len(self.boards)
+
+    @property
+    def grids(self):
+        return np.where(self.boards > 0, np.left_shift(1, self.boards.astype(np.int64)), 0)
+
+    def max_tiles(self):
+        return np.left_shift(1, self.boards.reshape(len(self), 16).max(axis=1).astype(np.int64))
+
+    def add_new_tiles(self, mask):
+        # Spawn a 2 (90%) or 4 (10%) on a random empty cell of every masked board
+        flat = self.boards.reshape(len(self), 16)
+        empty = flat == 0
+        empty_count = empty.sum(axis=1)
+        mask = mask & (empty_count > 0)
+        if not mask.any():
+            return
+        idx = np.nonzero(mask)[0]
+        state, cell_draw = _next_random(self.rng_state[idx])
+        state, tile_draw = _next_random(state)
+        self.rng_state[idx] = state
+        pick = (cell_draw % empty_count[idx].astype(np.uint64)).astype(np.int64)
+        ranks = np.cumsum(empty[idx], axis=1) - 1
+        cells = np.argmax(empty[idx] & (ranks == pick[:, None]), axis=1)
+        chance = (tile_draw >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+        flat[idx, cells] = np.where(chance < 0.9, 1, 2)
+
+    def step(self, moves):
+        # Apply one move per board; boards that are already over are left alone.
+        # Returns a bool array telling which boards actually moved.
+        moves = np.broadcast_to(np.asarray(moves, dtype=np.int64), (len(self),))
+        moved = np.zeros(len(self), dtype=bool)
+        for direction in (LEFT, RIGHT, UP, DOWN):
+            idx = np.nonzero((moves == direction) & ~self.game_over)[0]
+            if len(idx) == 0:
+                continue
+            view = _orient(self.boards[idx], direction)
+            slid, gained = slide_left(view)
+            changed = (slid != view).any(axis=(1, 2))
+            self.boards[idx] = _unorient(slid, direction)
+            self.scores[idx] += gained
+            moved[idx] = changed
+        self.moves += moved
+        self.add_new_tiles(moved)
+        self.game_over = self.check_game_over()
+        return moved
+
+    def check_game_over(self):
+        boards = self.boards
+        has_empty = (boards == 0).any(axis=(1, 2))
+        horizontal = (boards[:, :, :-1] == boards[:, :, 1:]).any(axis=(1, 2))
+        vertical = (boards[:, :-1, :] == boards[:, 1:, :]).any(axis=(1, 2))
+        return ~(has_empty | horizontal | vertical)
+
+    def to_bitboards(self):
+        # Pack every board into the 64-bit layout used by bitboard2048
+        flat = self.boards.reshape(len(self), 16).astype(np.uint64)
+        shifts = np.arange(0, 64, 4, dtype=np.uint64)
+        return np.bitwise_or.reduce(flat << shifts, axis=1)
+
+
+def play_random(count, seed=None):
+    # Plays count random games to the end and returns the final batch
+    batch = BatchGame2048(count, seed=seed)
+    rng = np.random.default_rng(seed)
+    while not batch.game_over.all():
+        batch.step(rng.integers(0, 4, size=count))
+    return batch
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    batch = play_random(10000, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"{len(batch)} games, {int(batch.moves.sum())} moves in {elapsed:.2f}s "
+          f"({batch.moves.sum() / elapsed:,.0f} moves/sec)")
+    print(f"Mean score {batch.scores.mean():.0f}, best tile {batch.max_tiles().max()}")
@@ -0,0 +1,232 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import bitboard2048
+from bitboard2048 import DIRECTIONS, unpack_grid
+from game2048 import Game2048
+
+SEED = 2048
+
+
+def sample_positions(count, seed=SEED):
+    # Packed boards taken from seeded random games, used as benchmark inputs
+    policy = random.Random(seed)
+    positions = []
+    game_seed = seed
+    while len(positions) < count:
+        game = bitboard2048.BitboardGame2048(seed=game_seed)
+        while not game.check_game_over() and len(positions) < count:
+            positions.append(game.board)
+            game.move(policy.choice(DIRECTIONS))
+        game_seed += 1
+    return positions
+
+
+def best_rate(func, ops, repeat):
+    # Best of several runs, reported as operations per second
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return ops / best
+
+
+def bench_grid_methods(positions, repeat):
+    grids = [unpack_grid(board) for board in positions]
+    directions = [DIRECTIONS[i % 4] for i in range(len(grids))]
+    game = Game2048(seed=SEED)
+    ops = len(grids)
+
+    # Every call gets a fresh copy of the grid, the copy alone is timed and subtracted
+    def copy_only():
+        for grid in grids:
+            game.grid = [row[:] for row in grid]
+
+    def slide_left():
+        for grid in grids:
+            game.grid = [row[:] for row in grid]
+            game.slide_left()
+
+    def rotate_grid():
+        for grid in grids:
+            game.grid = [row[:] for row in grid]
+            game.rotate_grid()
+
+    def add_new_tile():
+        for grid in grids:
+            game.grid = [row[:] for row in grid]
+            game.add_new_tile()
+
+    def move():
+        for grid, direction in zip(grids, directions):
+            game.grid = [row[:] for row in grid]
+            game.move(direction)
+
+    def check_game_over():
+        for grid in grids:
+            game.grid = grid
+            game.check_game_over()
+
+    copy_time = ops / best_rate(copy_only, ops, repeat)
+    results = {}
+    for name, func in [("slide_left", slide_left), ("rotate_grid", rotate_grid),
+                       ("add_new_tile", add_new_tile), ("move", move)]:
+        elapsed = ops / best_rate(func, ops, repeat) - copy_time
+        results[f"Game2048.{name}"] = ops / max(elapsed, 1e-9)
+    results["Game2048.check_game_over"] = best_rate(check_game_over, ops, repeat)
+    return results
+
+
+def bench_bitboard(positions, repeat):
+    bitboard2048.build_tables()
+    directions = [DIRECTIONS[i % 4] for i in range(len(positions))]
+    game = bitboard2048.BitboardGame2048(seed=SEED)
+    ops = len(positions)
+
+    def move_board():
+        for board, direction in zip(positions, directions):
+            bitboard2048.move_board(board, direction)
+
+    def move():
+        for board, direction in zip(positions, directions):
+            game.board = board
+            game.move(direction)
+
+    def check_game_over():
+        for board in positions:
+            game.board = board
+            game.check_game_over()
+
+    return {
+        "bitboard.move_board": best_rate(move_board, ops, repeat),
+        "BitboardGame2048.move": best_rate(move, ops, repeat),
+        "BitboardGame2048.check_game_over": best_rate(check_game_over, ops, repeat),
+    }
+
+
+def play_random_games(make_game, games, seed=SEED):
+    policy = random.Random(seed)
+    moves = 0
+    for i in range(games):
+        game = make_game(seed + i)
+        while not game.check_game_over():
+            game.move(policy.choice(DIRECTIONS))
+            moves += 1
+    return moves
+
+
+def bench_games(games, repeat):
+    results = {}
+    for name, make_game in [("Game2048", lambda seed: Game2048(seed=seed)),
+                            ("BitboardGame2048", lambda seed: bitboard2048.BitboardGame2048(seed=seed))]:
+        results[f"{name}.games"] = best_rate(lambda: play_random_games(make_game, games), games, repeat)
+    return results
+
+
+def bench_memory(positions):
+    # Memory per move as tracemalloc sees it: the peak bytes in use above the
+    # starting point while a move runs, and the memory blocks still alive
+    # afterwards. Python can't count every allocation a move makes, blocks
+    # allocated and freed again only show up in the peak.
+    results = {}
+    for name, make_game, load in [
+        ("Game2048", lambda: Game2048(seed=SEED), lambda game, board: setattr(game, "grid", unpack_grid(board))),
+        ("BitboardGame2048", lambda: bitboard2048.BitboardGame2048(seed=SEED), lambda game, board: setattr(game, "board", board)),
+    ]:
+        game = make_game()
+        peak_total = 0
+        tracemalloc.start()
+        start_blocks = sys.getallocatedblocks()
+        for i, board in enumerate(positions):
+            load(game, board)
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            game.move(DIRECTIONS[i % 4])
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        blocks = sys.getallocatedblocks() - start_blocks
+        tracemalloc.stop()
+        results[f"{name}.move.peak_bytes"] = peak_total / len(positions)
+        results[f"{name}.move.retained_blocks"] = blocks / len(positions)
+    return results
+
+
+def run(quick=False):
+    positions = sample_positions(500 if quick else 5000)
+    repeat = 3 if quick else 5
+    results = {}
+    results.update(bench_grid_methods(positions, repeat))
+    results.update(bench_bitboard(positions, repeat))
+    results.update(bench_games(5 if quick else 50, repeat))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "positions": len(positions),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "memory": bench_memory(positions[:500]),
+    }
+
+
+def compare(current, baseline, tolerance):
+    # Returns the names of benchmarks that got slower than the tolerance allows
+    regressions = []
+    for name, rate in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        change = rate / old - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"  {name:40} {old:14,.0f} -> {rate:14,.0f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the 2048 engine hot paths")
+    parser.add_argument("--out", default="bench_results.json", help="where to save this run")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="stored run to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before failing")
+    parser.add_argument("--quick", action="store_true", help="fewer positions and repeats")
+    args = parser.parse_args()
+
+    current = run(args.quick)
+    for name, rate in current["results"].items():
+        print(f"{name:40} {rate:14,.0f} /sec")
+    print("Memory per move (tracemalloc):")
+    for name, value in current["memory"].items():
+        print(f"  {name:38} {value:14,.1f}")
+    with open(args.out, 'w') as file:
+        json.dump(current, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(current, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    try:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    print(f"Compared with {args.baseline}:")
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
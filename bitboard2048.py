@@ -0,0 +1,290 @@
+import random
+from array import array
+
+from instrument import timed
+
+# The board is packed into one 64-bit integer. Every cell is a 4-bit nibble
+# holding the log2 exponent of the tile (0 = empty, 1 = 2, 2 = 4, ...).
+# Row r lives in bits 16*r .. 16*r+15 and column c of that row in bits 4*c.
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+
+DIRECTIONS = ("Left", "Right", "Up", "Down")
+
+# 65536-entry lookup tables, filled in by build_tables()
+ROW_LEFT = []
+ROW_RIGHT = []
+COL_UP = []
+COL_DOWN = []
+ROW_SCORE = []
+
+
+def reverse_row(row):
+    return ((row >> 12) | ((row >> 4) & 0x00F0) | ((row << 4) & 0x0F00) | (row << 12)) & ROW_MASK
+
+
+def unpack_col(row):
+    # Spread the four nibbles of a row down one column of the board
+    return (row | (row << 12) | (row << 24) | (row << 36)) & COL_MASK
+
+
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def slide_row_left(row):
+    # Slide one packed row to the left, returns (new_row, score_gained)
+    tiles = [(row >> (4 * i)) & 0xF for i in range(4)]
+    tiles = [tile for tile in tiles if tile != 0]
+    merged = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        # Exponent 15 (32768) is the largest tile that fits in a nibble
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] < 15:
+            merged.append(tiles[i] + 1)
+            score += 1 << (tiles[i] + 1)
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    new_row = 0
+    for i, tile in enumerate(merged):
+        new_row |= tile << (4 * i)
+    return new_row, score
+
+
+def build_tables():
+    if ROW_LEFT:
+        return
+    for row in range(65536):
+        new_row, score = slide_row_left(row)
+        ROW_LEFT.append(new_row)
+        ROW_SCORE.append(score)
+    for row in range(65536):
+        # Sliding right is sliding the reversed row left and reversing back
+        ROW_RIGHT.append(reverse_row(ROW_LEFT[reverse_row(row)]))
+        COL_UP.append(unpack_col(ROW_LEFT[row]))
+        COL_DOWN.append(unpack_col(ROW_RIGHT[row]))
+
+
+def move_left(board):
+    score = 0
+    new_board = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        new_board |= ROW_LEFT[row] << shift
+        score += ROW_SCORE[row]
+    return new_board, score
+
+
+def move_right(board):
+    score = 0
+    new_board = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        new_board |= ROW_RIGHT[row] << shift
+        score += ROW_SCORE[row]
+    return new_board, score
+
+
+def move_up(board):
+    # Columns become rows after a transpose, the column tables put them back
+    t = transpose(board)
+    score = 0
+    new_board = 0
+    for c in range(4):
+        col = (t >> (16 * c)) & ROW_MASK
+        new_board |= COL_UP[col] << (4 * c)
+        score += ROW_SCORE[col]
+    return new_board, score
+
+
+def move_down(board):
+    t = transpose(board)
+    score = 0
+    new_board = 0
+    for c in range(4):
+        col = (t >> (16 * c)) & ROW_MASK
+        new_board |= COL_DOWN[col] << (4 * c)
+        score += ROW_SCORE[col]
+    return new_board, score
+
+
+MOVES = {"Left": move_left, "Right": move_right, "Up": move_up, "Down": move_down}
+
+
+def move_board(board, direction):
+    # Returns (new_board, score_gained); new_board == board if nothing moved
+    return MOVES[direction](board)
+
+
+def empty_cells(board):
+    return [i for i in range(16) if (board >> (4 * i)) & 0xF == 0]
+
+
+def count_empty(board):
+    count = 0
+    for i in range(16):
+        if (board >> (4 * i)) & 0xF == 0:
+            count += 1
+    return count
+
+
+def max_tile(board):
+    return 1 << max((board >> (4 * i)) & 0xF for i in range(16))
+
+
+def can_move(board):
+    if count_empty(board):
+        return True
+    return move_left(board)[0] != board or move_up(board)[0] != board
+
+
+def pack_grid(grid):
+    board = 0
+    for r in range(4):
+        for c in range(4):
+            value = grid[r][c]
+            if value:
+                board |= (value.bit_length() - 1) << (4 * (4 * r + c))
+    return board
+
+
+def unpack_grid(board):
+    grid = []
+    for r in range(4):
+        row = []
+        for c in range(4):
+            exponent = (board >> (4 * (4 * r + c))) & 0xF
+            row.append(1 << exponent if exponent else 0)
+        grid.append(row)
+    return grid
+
+
+class SnapshotStack:
+    # Fixed-capacity stack of (board, score) pairs kept in two flat arrays, so
+    # every entry costs 16 bytes. Pushing onto a full stack drops the oldest.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.boards = array('Q', bytes(8 * capacity))
+        self.scores = array('q', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, board, score):
+        if self.capacity == 0:
+            return
+        i = (self.start + self.size) % self.capacity
+        self.boards[i] = board
+        self.scores[i] = score
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.size += 1
+
+    def pop(self):
+        if self.size == 0:
+            return None
+        self.size -= 1
+        i = (self.start + self.size) % self.capacity
+        return self.boards[i], self.scores[i]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
+class UndoHistory:
+    # Bounded undo/redo history of packed boards
+    def __init__(self, capacity=100):
+        self.undo_stack = SnapshotStack(capacity)
+        self.redo_stack = SnapshotStack(capacity)
+
+    def push(self, board, score):
+        # A new move makes the undone states unreachable
+        self.undo_stack.push(board, score)
+        self.redo_stack.clear()
+
+    def undo(self, board, score, steps=1):
+        # Returns the (board, score) to restore, or None if there is nothing to undo
+        return self._travel(self.undo_stack, self.redo_stack, board, score, steps)
+
+    def redo(self, board, score, steps=1):
+        return self._travel(self.redo_stack, self.undo_stack, board, score, steps)
+
+    def _travel(self, source, target, board, score, steps):
+        state = None
+        for _ in range(steps):
+            previous = source.pop()
+            if previous is None:
+                break
+            target.push(board, score)
+            board, score = state = previous
+        return state
+
+    def can_undo(self):
+        return len(self.undo_stack) > 0
+
+    def can_redo(self):
+        return len(self.redo_stack) > 0
+
+
+class BitboardGame2048:
+    # Drop-in replacement for Game2048 that works on a packed 64-bit board
+    def __init__(self, history_size=100, seed=None):
+        build_tables()
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.board = 0
+        self.score = 0
+        self.history = UndoHistory(history_size)
+        self.add_new_tile()
+        self.add_new_tile()
+
+    @property
+    def grid(self):
+        return unpack_grid(self.board)
+
+    def add_new_tile(self):
+        empty = empty_cells(self.board)
+        if empty:
+            i = self.rng.choice(empty)
+            self.board |= (1 if self.rng.random() < 0.9 else 2) << (4 * i)
+
+    @timed("BitboardGame2048.move")
+    def move(self, direction):
+        new_board, gained = move_board(self.board, direction)
+        moved = new_board != self.board
+        if moved:
+            self.save_state()
+            self.board = new_board
+            self.score += gained
+            self.add_new_tile()
+        return moved
+
+    def check_game_over(self):
+        return not can_move(self.board)
+
+    def save_state(self):
+        self.history.push(self.board, self.score)
+
+    def undo(self, steps=1):
+        state = self.history.undo(self.board, self.score, steps)
+        if state:
+            self.board, self.score = state
+
+    def redo(self, steps=1):
+        state = self.history.redo(self.board, self.score, steps)
+        if state:
+            self.board, self.score = state
@@ -0,0 +1,167 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from functools import lru_cache
+from hashlib import blake2b
+
+# A Bloom filter of breached passwords, built once from a corpus with one
+# password per line and then memory-mapped, so checking a password reads k
+# bits from the page cache instead of loading the list. A password that is
+# in the corpus is always found; one that is not is reported as breached
+# with about the false positive rate chosen when the filter was built.
+#
+# File layout: HEADER (magic, bits, hashes, entries, false positive rate),
+# then the bit array, bit i being bit i % 8 of byte i // 8.
+MAGIC = b"BLOOMPW1"
+HEADER = struct.Struct("<8sQIQd")
+
+
+def filter_size(entries, fp_rate):
+    # Bits and number of hashes that give fp_rate for entries items
+    bits = max(8, math.ceil(-entries * math.log(fp_rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / max(entries, 1) * math.log(2)))
+    return bits, hashes
+
+
+def bit_positions(password, bits, hashes):
+    # Double hashing: the i-th position is h1 + i * h2 from one 128 bit digest
+    digest = blake2b(password, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def read_passwords(path, chunk_size=1 << 22):
+    # Yields the lines of the corpus as bytes without their line endings
+    with open(path, 'rb') as file:
+        carry = b''
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            lines = (carry + chunk).split(b'\n')
+            carry = lines.pop()
+            for line in lines:
+                line = line.rstrip(b'\r')
+                if line:
+                    yield line
+        carry = carry.rstrip(b'\r')
+        if carry:
+            yield carry
+
+
+def count_lines(path, chunk_size=1 << 22):
+    # Upper bound on the entries, cheap enough to size the filter with
+    count = 0
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            count += chunk.count(b'\n')
+    return count + 1
+
+
+def build_filter(corpus, out, fp_rate=0.001, entries=None, progress=True):
+    # Writes the filter for the corpus file to out and returns (entries, bits, hashes)
+    entries = entries or count_lines(corpus)
+    bits, hashes = filter_size(entries, fp_rate)
+    array = bytearray((bits + 7) // 8)
+    added = 0
+    start = time.perf_counter()
+    for password in read_passwords(corpus):
+        for position in bit_positions(password, bits, hashes):
+            array[position >> 3] |= 1 << (position & 7)
+        added += 1
+        if progress and added % 1000000 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"\r{added:,} passwords, {added / elapsed:,.0f}/sec", end="", file=sys.stderr, flush=True)
+    if progress and added >= 1000000:
+        print(file=sys.stderr)
+    temp_file = out + ".tmp"
+    with open(temp_file, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, bits, hashes, added, fp_rate))
+        file.write(array)
+    os.replace(temp_file, out)
+    return added, bits, hashes
+
+
+class BreachFilter:
+    # Read-only, memory-mapped view of a filter file. Counts its lookups and
+    # hits so callers can report how often generated passwords were breached.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            # Too short for the header (an empty file can't even be mapped)
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a breach filter")
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bits, self.hashes, self.entries, self.fp_rate = HEADER.unpack_from(self.map)
+        if magic != MAGIC or len(self.map) < HEADER.size + (self.bits + 7) // 8:
+            self.map.close()
+            raise ValueError(f"{path} is not a breach filter")
+        self.lookups = 0
+        self.hits = 0
+
+    def __contains__(self, password):
+        if isinstance(password, str):
+            password = password.encode()
+        self.lookups += 1
+        data = self.map
+        for position in bit_positions(password, self.bits, self.hashes):
+            if not data[HEADER.size + (position >> 3)] >> (position & 7) & 1:
+                return False
+        self.hits += 1
+        return True
+
+    def close(self):
+        self.map.close()
+
+
+@lru_cache(maxsize=None)
+def open_filter(path):
+    # One shared BreachFilter per path and process
+    return BreachFilter(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a Bloom filter of breached passwords")
+    commands = parser.add_subparsers(dest="command", required=True)
+    builder = commands.add_parser("build", help="build a filter from a file with one password per line")
+    builder.add_argument("corpus")
+    builder.add_argument("out")
+    builder.add_argument("--fp-rate", type=float, default=0.001, help="false positive rate to size the filter for")
+    builder.add_argument("--entries", type=int, help="expected passwords, counted from the file by default")
+    checker = commands.add_parser("check", help="check passwords, given or one per line on stdin")
+    checker.add_argument("filter")
+    checker.add_argument("passwords", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not 0 < args.fp_rate < 1:
+            print("Error: --fp-rate must be between 0 and 1")
+            return
+        start = time.perf_counter()
+        entries, bits, hashes = build_filter(args.corpus, args.out, args.fp_rate, args.entries)
+        print(f"{entries:,} passwords in {bits / 8 / 2 ** 20:,.1f} MiB with {hashes} hashes "
+              f"({time.perf_counter() - start:.1f}s)")
+        return
+
+    try:
+        breach_filter = BreachFilter(args.filter)
+    except (OSError, ValueError) as error:
+        print(f"Error: {error}")
+        return
+    passwords = args.passwords or (line.rstrip('\r\n') for line in sys.stdin)
+    start = time.perf_counter()
+    for password in passwords:
+        print(f"{'BREACHED' if password in breach_filter else 'ok':>8}  {password}")
+    elapsed = time.perf_counter() - start
+    if breach_filter.lookups:
+        print(f"{breach_filter.hits} of {breach_filter.lookups} breached "
+              f"({elapsed / breach_filter.lookups * 1e6:.1f} us per lookup)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import csv
+import itertools
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+DEFAULT_COLUMNS = {'date': 'date', 'amount': 'amount', 'category': 'category', 'description': 'description'}
+
+
+@lru_cache(maxsize=65536)
+def normalize_date(text, date_format):
+    # Statement dates repeat a lot, so each distinct string is only parsed once
+    return datetime.strptime(text.strip(), date_format).strftime('%d-%m-%Y')
+
+
+def parse_chunk(rows, positions, category_lookup, date_format):
+    # rows are (line number, row) pairs. Returns (expenses, rejects), where the
+    # expenses have no id yet and rejects are (line number, row, reason).
+    expenses = []
+    rejects = []
+    date_at, amount_at, category_at, description_at = positions
+    for line_number, row in rows:
+        try:
+            category = category_lookup.get(row[category_at].strip().lower())
+            if category is None:
+                rejects.append((line_number, row, f"unknown category '{row[category_at]}'"))
+                continue
+            try:
+                date = normalize_date(row[date_at], date_format)
+            except ValueError:
+                rejects.append((line_number, row, f"invalid date '{row[date_at]}'"))
+                continue
+            try:
+                amount = float(row[amount_at])
+                if not math.isfinite(amount):
+                    raise ValueError  # inf and nan parse but are not amounts
+            except ValueError:
+                rejects.append((line_number, row, f"invalid amount '{row[amount_at]}'"))
+                continue
+            description = row[description_at] if description_at is not None else ""
+        except IndexError:
+            rejects.append((line_number, row, "missing columns"))
+            continue
+        expenses.append({'amount': amount, 'description': description, 'category': category, 'date': date})
+    return expenses, rejects
+
+
+def read_chunks(reader, chunk_size, first_line=2):
+    line_number = first_line
+    while True:
+        chunk = list(zip(itertools.count(line_number), itertools.islice(reader, chunk_size)))
+        if not chunk:
+            return
+        line_number += len(chunk)
+        yield chunk
+
+
+def parsed_chunks(chunks, positions, category_lookup, date_format, workers):
+    # Yields parse_chunk results in file order. With workers > 1 at most
+    # 2 * workers chunks are in flight, so memory stays bounded.
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk, positions, category_lookup, date_format)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        in_flight = []
+        for chunk in chunks:
+            in_flight.append(pool.submit(parse_chunk, chunk, positions, category_lookup, date_format))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+
+def import_csv(tracker, path, rejects_file=None, columns=None, date_format='%d-%m-%Y',
+               chunk_size=50000, workers=1):
+    # Streams a (possibly huge) CSV into the tracker one chunk at a time.
+    # Returns (imported, rejected) counts.
+    columns = dict(DEFAULT_COLUMNS, **(columns or {}))
+    # Case-insensitive category lookup, built once
+    category_lookup = {category.lower(): category for category in tracker.categories}
+    imported = rejected = 0
+    rejects_out = None
+    with open(path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return 0, 0
+        names = [name.strip().lower() for name in header]
+        try:
+            positions = tuple(names.index(columns[key].lower()) for key in ('date', 'amount', 'category'))
+        except ValueError:
+            raise ValueError(f"{path} needs the columns {columns['date']}, {columns['amount']} "
+                             f"and {columns['category']}, found {header}")
+        description = columns['description'].lower()
+        positions += (names.index(description) if description in names else None,)
+        try:
+            for expenses, rejects in parsed_chunks(read_chunks(reader, chunk_size), positions,
+                                                   category_lookup, date_format, workers):
+                tracker.add_expenses(expenses)
+                imported += len(expenses)
+                rejected += len(rejects)
+                if rejects and rejects_file:
+                    if rejects_out is None:
+                        rejects_out = open(rejects_file, 'w', newline='')
+                        writer = csv.writer(rejects_out)
+                        writer.writerow(['line', 'reason'] + header)
+                    writer.writerows([line_number, reason] + row for line_number, row, reason in rejects)
+        finally:
+            if rejects_out is not None:
+                rejects_out.close()
+    return imported, rejected
+
+
+def self_check():
+    # Parses rows with known problems and checks each is rejected for the
+    # right reason while the good ones get through. Returns True when they do.
+    lookup = {'food': 'Food'}
+    positions = (0, 1, 2, 3)
+    cases = [
+        (['01-02-2024', '12.50', 'food', 'lunch'], None),
+        (['1-2-2024', '3', 'FOOD', ''], None),
+        (['01-02-2024', '1', 'rent', ''], "unknown category"),
+        (['31-02-2024', '1', 'food', ''], "invalid date"),
+        (['01-02-2024', 'abc', 'food', ''], "invalid amount"),
+        (['01-02-2024', 'inf', 'food', ''], "invalid amount"),
+        (['01-02-2024', '-Infinity', 'food', ''], "invalid amount"),
+        (['01-02-2024', 'nan', 'food', ''], "invalid amount"),
+        (['01-02-2024', '1'], "missing columns"),
+    ]
+    expenses, rejects = parse_chunk(list(enumerate((row for row, _ in cases), start=2)),
+                                    positions, lookup, '%d-%m-%Y')
+    reasons = {line_number: reason for line_number, row, reason in rejects}
+    ok = len(expenses) == sum(1 for _, expected in cases if expected is None)
+    for line_number, (row, expected) in enumerate(cases, start=2):
+        reason = reasons.get(line_number)
+        if (expected is None) != (reason is None) or (expected and not reason.startswith(expected)):
+            ok = False
+            print(f"{row}: expected {expected or 'accepted'}, got {reason or 'accepted'}")
+    print("All rows handled correctly." if ok else "Mismatches found.")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if self_check() else 1)
@@ -0,0 +1,244 @@
+import heapq
+import json
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+
+def date_ordinal(text):
+    # 'DD-MM-YYYY' (zero padding optional) -> proleptic Gregorian ordinal
+    day, month, year = text.split('-')
+    return date(int(year), int(month), int(day)).toordinal()
+
+
+def to_cents(amount):
+    return round(float(amount) * 100)
+
+
+class ExpenseIndex:
+    # Columnar, pre-parsed copy of the ledger for summaries. Rows are kept
+    # sorted by date in parallel arrays: date ordinals, amounts in integer
+    # cents, interned category codes and expense ids. A date range is found
+    # with two binary searches and only the rows inside it are visited.
+    def __init__(self, expenses=()):
+        self.ordinals = array('l')
+        self.cents = array('q')
+        self.codes = array('l')
+        self.ids = array('q')
+        self.category_names = []
+        self.category_codes = {}
+        self.skipped = 0  # rows with a date or amount that could not be parsed
+        rows = []
+        for expense in expenses:
+            row = self.parse(expense)
+            if row is None:
+                self.skipped += 1
+            else:
+                rows.append(row)
+        rows.sort()
+        self.fill(rows)
+
+    def fill(self, rows):
+        for ordinal, expense_id, cents, code in rows:
+            self.ordinals.append(ordinal)
+            self.ids.append(expense_id)
+            self.cents.append(cents)
+            self.codes.append(code)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def category_code(self, category):
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def parse(self, expense):
+        try:
+            return (date_ordinal(expense['date']), int(expense['id']),
+                    to_cents(expense['amount']), self.category_code(expense['category']))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return None
+
+    def add(self, expense):
+        row = self.parse(expense)
+        if row is None:
+            self.skipped += 1
+            return
+        self.insert(row)
+
+    def insert(self, row):
+        ordinal, expense_id, cents, code = row
+        i = bisect_right(self.ordinals, ordinal)
+        self.ordinals.insert(i, ordinal)
+        self.ids.insert(i, expense_id)
+        self.cents.insert(i, cents)
+        self.codes.insert(i, code)
+
+    def add_many(self, expenses):
+        # Sort the new rows and merge them in one pass instead of one insert each
+        rows = []
+        for expense in expenses:
+            row = self.parse(expense)
+            if row is None:
+                self.skipped += 1
+            else:
+                rows.append(row)
+        if len(rows) < 64:
+            for row in rows:
+                self.insert(row)
+            return
+        rows.sort()
+        merged = list(heapq.merge(zip(self.ordinals, self.ids, self.cents, self.codes), rows))
+        self.ordinals, self.ids, self.cents, self.codes = array('l'), array('q'), array('q'), array('l')
+        self.fill(merged)
+
+    def remove(self, expense):
+        row = self.parse(expense)
+        if row is None:
+            self.skipped -= 1
+            return
+        ordinal, expense_id = row[0], row[1]
+        lo = bisect_left(self.ordinals, ordinal)
+        hi = bisect_right(self.ordinals, ordinal, lo)
+        for i in range(lo, hi):
+            if self.ids[i] == expense_id:
+                del self.ordinals[i]
+                del self.ids[i]
+                del self.cents[i]
+                del self.codes[i]
+                return
+
+    def summarize(self, start_date=None, end_date=None):
+        # Summary of the expenses dated in [start_date, end_date], see make_summary
+        lo, hi = 0, len(self.ordinals)
+        if start_date and end_date:
+            lo = bisect_left(self.ordinals, start_date.toordinal())
+            hi = bisect_right(self.ordinals, end_date.toordinal(), lo)
+        totals = [0] * len(self.category_names)
+        counts = [0] * len(self.category_names)
+        # Categories are listed in the order they first appear in the range,
+        # like a scan of the ledger does; ids grow in ledger order
+        first_ids = [None] * len(self.category_names)
+        for code, cents, expense_id in zip(self.codes[lo:hi], self.cents[lo:hi], self.ids[lo:hi]):
+            totals[code] += cents
+            counts[code] += 1
+            if first_ids[code] is None or expense_id < first_ids[code]:
+                first_ids[code] = expense_id
+        used = sorted((code for code in range(len(totals)) if counts[code]), key=first_ids.__getitem__)
+        return make_summary((self.category_names[code], totals[code], counts[code]) for code in used)
+
+
+def make_summary(category_rows):
+    # Builds the structured summary every backend returns from
+    # (category, total in cents, count) rows:
+    #   {"total": 12.5, "count": 3, "categories": {"Food": {"total": 7.5, "count": 2}, ...}}
+    categories = {}
+    total = count = 0
+    for category, cents, rows in category_rows:
+        categories[category] = {"total": cents / 100, "count": rows}
+        total += cents
+        count += rows
+    return {"total": total / 100, "count": count, "categories": categories}
+
+
+class ExpenseRollups:
+    # Materialized totals per (year, month, category), kept up to date on every
+    # add and delete so period summaries never look at individual expenses.
+    # They are saved next to the ledger together with a stamp describing the
+    # ledger they were built from; a stale file is rebuilt on load.
+    def __init__(self):
+        # (year, month) -> {category: [cents, count, id of its first expense]}
+        self.months = {}
+
+    @classmethod
+    def build(cls, expenses):
+        rollups = cls()
+        for expense in expenses:
+            rollups.add(expense)
+        return rollups
+
+    @staticmethod
+    def parse(expense):
+        # ((year, month), cents, id), or None for a row with a bad date or
+        # amount. Dates are checked the way ExpenseIndex checks them, so the
+        # rollups and the range summaries skip exactly the same rows.
+        try:
+            day = date.fromordinal(date_ordinal(expense['date']))
+            return (day.year, day.month), to_cents(expense['amount']), int(expense['id'])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return None
+
+    def add(self, expense):
+        row = self.parse(expense)
+        if row is None:
+            return
+        month, cents, expense_id = row
+        categories = self.months.setdefault(month, {})
+        cell = categories.get(expense['category'])
+        if cell is None:
+            categories[expense['category']] = [cents, 1, expense_id]
+        else:
+            cell[0] += cents
+            cell[1] += 1
+            cell[2] = min(cell[2], expense_id)
+
+    def remove(self, expense):
+        # Only the expense's own amount is taken out. The cell keeps its first
+        # id even when that expense is the one removed: it still sorts the
+        # category no later than its remaining expenses, and a rebuild of the
+        # rollups restores the exact order.
+        row = self.parse(expense)
+        if row is None:
+            return
+        month, cents, expense_id = row
+        categories = self.months.get(month, {})
+        cell = categories.get(expense['category'])
+        if cell is None:
+            return
+        cell[0] -= cents
+        cell[1] -= 1
+        if cell[1] == 0:
+            del categories[expense['category']]
+
+    def summarize(self, year, month=None):
+        # One month, or a whole year when month is None. Categories are listed
+        # in the order they first appear in the period, like a scan of the ledger.
+        months = [month] if month else range(1, 13)
+        totals = {}
+        for m in months:
+            for category, (cents, count, first_id) in self.months.get((year, m), {}).items():
+                cell = totals.setdefault(category, [0, 0, first_id])
+                cell[0] += cents
+                cell[1] += count
+                cell[2] = min(cell[2], first_id)
+        rows = sorted(totals.items(), key=lambda item: item[1][2])
+        return make_summary((category, cents, count) for category, (cents, count, first_id) in rows)
+
+    def save(self, path, stamp):
+        data = {
+            "stamp": stamp,
+            "months": [[year, month, categories] for (year, month), categories in self.months.items()],
+        }
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path, stamp):
+        # Returns None when there is no saved file or it belongs to a different ledger state
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("stamp") != stamp:
+            return None
+        rollups = cls()
+        for year, month, categories in data["months"]:
+            rollups.months[(year, month)] = categories
+        return rollups
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from week3 import ExpenseTracker
+
+# A ledger in the reports directory is either a folder holding the files the
+# tracker normally uses (expenses.csv, categories.csv, currency.txt) or a
+# single <name>.csv file. Missing category or currency files are fine, the
+# tracker runs non-interactively and derives them. Reports only read the
+# ledgers: nothing is written into the scanned directories, not even the CSV
+# snapshot, rollups, journal or database the backend would normally create.
+
+
+def find_ledgers(directory):
+    # Returns (name, data_file, category_file, currency_file) tuples sorted by name
+    ledgers = []
+    for entry in os.scandir(directory):
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'expenses.csv')):
+            ledgers.append((entry.name, os.path.join(entry.path, 'expenses.csv'),
+                            os.path.join(entry.path, 'categories.csv'),
+                            os.path.join(entry.path, 'currency.txt')))
+        elif entry.is_file() and entry.name.endswith('.csv') and not entry.name.endswith('.categories.csv'):
+            base = entry.path[:-len('.csv')]
+            ledgers.append((entry.name[:-len('.csv')], entry.path,
+                            base + '.categories.csv', base + '.currency.txt'))
+    ledgers.sort()
+    return ledgers
+
+
+def report_ledger(ledger, storage="csv", start_date=None, end_date=None, year=None, month=None):
+    # Runs in a worker, never raises: a broken ledger is reported with its error
+    name, data_file, category_file, currency_file = ledger
+    report = {"ledger": name, "file": data_file}
+    start = time.perf_counter()
+    try:
+        tracker = ExpenseTracker(data_file, category_file, currency_file, storage=storage,
+                                 interactive=False, cache=False)
+        loaded = time.perf_counter()
+        try:
+            report["currency"] = tracker.currency
+            report["expenses"] = len(tracker.expenses)
+            report["summary"] = tracker.summarize(start_date, end_date)
+            if year:
+                report["period"] = tracker.get_period_summary(year, month)
+        finally:
+            tracker.close()
+        report["load_seconds"] = loaded - start
+        report["summary_seconds"] = time.perf_counter() - loaded
+    except Exception as error:
+        report["error"] = f"{type(error).__name__}: {error}"
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def run_reports(directory, workers=None, executor="process", progress=True, **options):
+    # Returns the reports in ledger order; options are passed to report_ledger
+    ledgers = find_ledgers(directory)
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    reports = []
+    start = time.perf_counter()
+    with pool_class(workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(report_ledger, ledger, **options) for ledger in ledgers]
+        for future in as_completed(futures):
+            reports.append(future.result())
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"\r{len(reports)}/{len(ledgers)} ledgers, {len(reports) / elapsed:,.1f} ledgers/sec",
+                      end="", flush=True)
+    if progress and ledgers:
+        print()
+    reports.sort(key=lambda report: report["ledger"])
+    return reports
+
+
+def write_json(path, reports, seconds):
+    with open(path, 'w') as file:
+        json.dump({"seconds": seconds, "ledgers": reports}, file, indent=2)
+
+
+def write_csv(path, reports):
+    # One row per ledger and category, plus a row with the ledger total where category is empty
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['ledger', 'currency', 'category', 'total', 'count', 'seconds', 'error'])
+        for report in reports:
+            summary = report.get("period") or report.get("summary")
+            if summary is None:
+                writer.writerow([report["ledger"], "", "", "", "", f"{report['seconds']:.6f}", report["error"]])
+                continue
+            writer.writerow([report["ledger"], report["currency"], "", f"{summary['total']:.2f}",
+                             summary["count"], f"{report['seconds']:.6f}", ""])
+            for category, values in summary["categories"].items():
+                writer.writerow([report["ledger"], report["currency"], category, f"{values['total']:.2f}",
+                                 values["count"], "", ""])
+
+
+def parse_date(text):
+    return datetime.strptime(text, '%d-%m-%Y') if text else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize every expense ledger in a directory")
+    parser.add_argument("directory")
+    parser.add_argument("--json", default="report.json", help="where to write the full report")
+    parser.add_argument("--csv", help="also write one row per ledger and category")
+    parser.add_argument("--storage", choices=["csv", "journal", "sqlite"], default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--start", help="first date (DD-MM-YYYY) of the summary")
+    parser.add_argument("--end", help="last date (DD-MM-YYYY) of the summary")
+    parser.add_argument("--year", type=int, help="also report this year from the monthly rollups")
+    parser.add_argument("--month", type=int, help="with --year, report just this month")
+    args = parser.parse_args()
+
+    try:
+        start_date, end_date = parse_date(args.start), parse_date(args.end)
+    except ValueError:
+        print("Invalid date format. Please use DD-MM-YYYY.")
+        return
+    if bool(start_date) != bool(end_date):
+        print("Give both --start and --end, or neither.")
+        return
+    if not os.path.isdir(args.directory):
+        print(f"{args.directory} is not a directory.")
+        return
+
+    start = time.perf_counter()
+    reports = run_reports(args.directory, args.workers, args.executor, storage=args.storage,
+                          start_date=start_date, end_date=end_date, year=args.year, month=args.month)
+    seconds = time.perf_counter() - start
+    write_json(args.json, reports, seconds)
+    if args.csv:
+        write_csv(args.csv, reports)
+    failed = [report for report in reports if "error" in report]
+    print(f"{len(reports)} ledgers in {seconds:.1f}s, report written to {args.json}")
+    if reports:
+        slowest = max(reports, key=lambda report: report["seconds"])
+        print(f"Slowest: {slowest['ledger']} ({slowest['seconds']:.3f}s)")
+    for report in failed:
+        print(f"Failed: {report['ledger']}: {report['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import MutableSequence
+
+from expense_index import ExpenseIndex
+
+# A snapshot is a binary copy of a CSV ledger that can be opened without
+# parsing anything. It is only trusted while the CSV still has the size and
+# modification time recorded in its header, otherwise the CSV is read again.
+#
+# Layout, every section starts on an 8 byte boundary:
+#   header    magic, CSV size, CSV mtime (ns), rows, highest id, meta size
+#   meta      JSON: category names of the rows and of the index, index sizes
+#   ids       array('q'), one per row in file order
+#   codes     array('l'), category code of each row
+#   offsets   array('Q'), 3 * rows + 1 offsets into the text blob
+#   text      amount, description and date of every row, UTF-8
+#   index     the ExpenseIndex arrays: ordinals, ids, cents, codes
+MAGIC = b"EXPSNAP1"
+HEADER = struct.Struct("<8sQqQqQ")
+
+
+def align(size):
+    return (size + 7) & ~7
+
+
+def csv_stamp(csv_file):
+    stat = os.stat(csv_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_snapshot(path, csv_file, expenses):
+    # Returns False when the snapshot could not be written, the CSV still works then
+    category_codes = {}
+    ids = array('q')
+    codes = array('l')
+    offsets = array('Q', [0])
+    text = bytearray()
+    for expense in expenses:
+        ids.append(int(expense['id']))
+        codes.append(category_codes.setdefault(expense.get('category') or "", len(category_codes)))
+        for field in ('amount', 'description', 'date'):
+            value = expense.get(field)
+            text += str(value if value is not None else "").encode()
+            offsets.append(len(text))
+    index = ExpenseIndex(expenses)
+    meta = json.dumps({
+        "categories": list(category_codes),
+        "index_categories": index.category_names,
+        "indexed": len(index),
+        "skipped": index.skipped,
+    }).encode()
+    sections = [meta, ids, codes, offsets, text, index.ordinals, index.ids, index.cents, index.codes]
+    temp_file = path + ".tmp"
+    try:
+        size, mtime = csv_stamp(csv_file)
+        with open(temp_file, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, size, mtime, len(ids), max(ids, default=0), len(meta)))
+            for section in sections:
+                data = section if isinstance(section, (bytes, bytearray)) else section.tobytes()
+                file.write(data)
+                file.write(b"\0" * (align(len(data)) - len(data)))
+        os.replace(temp_file, path)
+        return True
+    except OSError:
+        return False
+
+
+class Snapshot:
+    # Read-only view of a snapshot file. Nothing is decoded up front, rows are
+    # built from the mapped columns when they are asked for.
+    def __init__(self, path, csv_file):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, size, mtime, self.count, self.max_id, meta_size = HEADER.unpack_from(self.map)
+            if magic != MAGIC or (size, mtime) != csv_stamp(csv_file):
+                raise ValueError("stale snapshot")
+            view = memoryview(self.map)
+            position = HEADER.size
+            self.meta = json.loads(bytes(view[position:position + meta_size]))
+            position += align(meta_size)
+            self.sections = []
+            n = self.count
+            m = self.meta["indexed"]
+            for typecode, length in [('q', n), ('l', n), ('Q', 3 * n + 1), ('B', None),
+                                     ('l', m), ('q', m), ('q', m), ('l', m)]:
+                if length is None:
+                    length = self.sections[2][-1]  # the last offset is the size of the text
+                nbytes = length * array(typecode).itemsize
+                if position + nbytes > len(self.map):
+                    raise ValueError("truncated snapshot")
+                self.sections.append(view[position:position + nbytes].cast(typecode))
+                position += align(nbytes)
+        except (struct.error, ValueError, KeyError, OSError):
+            self.close()
+            raise ValueError(f"{path} does not match {csv_file}")
+        self.ids, self.codes, self.offsets, self.text = self.sections[:4]
+        self.categories = self.meta["categories"]
+
+    def row(self, i):
+        offsets = self.offsets
+        text = self.text
+        k = 3 * i
+        return {
+            'amount': str(text[offsets[k]:offsets[k + 1]], 'utf-8'),
+            'description': str(text[offsets[k + 1]:offsets[k + 2]], 'utf-8'),
+            'category': self.categories[self.codes[i]],
+            'date': str(text[offsets[k + 2]:offsets[k + 3]], 'utf-8'),
+            'id': str(self.ids[i]),
+        }
+
+    def build_index(self):
+        # The index arrays are copied out so it can be updated afterwards
+        index = ExpenseIndex()
+        columns = []
+        for section in self.sections[4:]:
+            column = array(section.format)
+            column.frombytes(section.cast("B"))
+            columns.append(column)
+        index.ordinals, index.ids, index.cents, index.codes = columns
+        for category in self.meta["index_categories"]:
+            index.category_code(category)
+        index.skipped = self.meta["skipped"]
+        return index
+
+    def close(self):
+        # The mapping stays open for as long as a view into it is alive
+        for section in getattr(self, 'sections', ()):
+            section.release()
+        self.sections = []
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+
+
+class SnapshotExpenses(MutableSequence):
+    # The expense list handed to ExpenseTracker when a snapshot is used. Reading
+    # builds rows straight from the snapshot; the first change copies every row
+    # into a normal list, so rows returned before that are independent copies.
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.rows = None
+        self.max_id = snapshot.max_id
+
+    def materialize(self):
+        if self.rows is None:
+            self.rows = [self.snapshot.row(i) for i in range(self.snapshot.count)]
+        return self.rows
+
+    def build_index(self):
+        if self.rows is not None:
+            return ExpenseIndex(self.rows)
+        return self.snapshot.build_index()
+
+    def __len__(self):
+        return len(self.rows) if self.rows is not None else self.snapshot.count
+
+    def __getitem__(self, i):
+        if self.rows is not None:
+            return self.rows[i]
+        if isinstance(i, slice):
+            return [self.snapshot.row(j) for j in range(*i.indices(self.snapshot.count))]
+        if i < 0:
+            i += self.snapshot.count
+        if not 0 <= i < self.snapshot.count:
+            raise IndexError("expense index out of range")
+        return self.snapshot.row(i)
+
+    def __iter__(self):
+        if self.rows is not None:
+            return iter(self.rows)
+        return (self.snapshot.row(i) for i in range(self.snapshot.count))
+
+    def __setitem__(self, i, value):
+        self.materialize()[i] = value
+
+    def __delitem__(self, i):
+        del self.materialize()[i]
+
+    def insert(self, i, value):
+        self.materialize().insert(i, value)
+
+    def extend(self, values):
+        self.materialize().extend(values)
+
+
+def load_snapshot(path, csv_file):
+    # Returns a SnapshotExpenses, or None when there is no usable snapshot
+    try:
+        return SnapshotExpenses(Snapshot(path, csv_file))
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,487 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from expense_index import make_summary
+from expense_snapshot import load_snapshot, write_snapshot
+from instrument import timed
+
+FIELDNAMES = ['amount', 'description', 'category', 'date', 'id']
+
+
+def assign_ids(expenses):
+    # Ledgers written before expenses had IDs get them in file order
+    next_id = 1
+    for expense in expenses:
+        if expense.get('id'):
+            next_id = max(next_id, int(expense['id']) + 1)
+    for expense in expenses:
+        if not expense.get('id'):
+            expense['id'] = str(next_id)
+            next_id += 1
+    return expenses
+
+
+class CsvStorage:
+    # The original format, the whole file is rewritten on every change.
+    # A binary snapshot next to it (see expense_snapshot) lets load() skip
+    # parsing the CSV while the CSV is unchanged since the snapshot was written.
+    # With save_snapshot=False an existing snapshot is used but never written.
+    def __init__(self, data_file, snapshot=True, save_snapshot=True):
+        self.data_file = data_file
+        self.path = data_file  # the file that holds the ledger
+        self.snapshot_file = data_file + ".snap" if snapshot else None
+        self.save_snapshot = save_snapshot
+        self.expenses = None  # what the snapshot is rewritten from on close
+        self.snapshot_stale = False
+
+    def load(self):
+        if not os.path.exists(self.data_file):
+            return []
+        if self.snapshot_file:
+            expenses = load_snapshot(self.snapshot_file, self.data_file)
+            if expenses is not None:
+                return expenses
+        with open(self.data_file, 'r') as file:
+            reader = csv.DictReader(file)
+            expenses = assign_ids([row for row in reader])
+        if self.snapshot_file and self.save_snapshot:
+            write_snapshot(self.snapshot_file, self.data_file, expenses)
+        return expenses
+
+    def save(self, expenses):
+        with open(self.data_file, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(expenses)
+        self.mark_changed(expenses)
+
+    def mark_changed(self, expenses):
+        # The snapshot is refreshed once on close instead of after every change
+        self.expenses = expenses
+        self.snapshot_stale = True
+
+    @timed("CsvStorage.add")
+    def add(self, expense, expenses):
+        self.save(expenses)
+
+    @timed("CsvStorage.add_many")
+    def add_many(self, new_expenses, expenses):
+        # Appending is only safe when the file already has the current header
+        if self.has_current_header():
+            with open(self.data_file, 'a', newline='') as file:
+                csv.DictWriter(file, fieldnames=FIELDNAMES).writerows(new_expenses)
+            self.mark_changed(expenses)
+        else:
+            self.save(expenses)
+
+    def has_current_header(self):
+        try:
+            with open(self.data_file, 'r', newline='') as file:
+                return next(csv.reader(file), None) == FIELDNAMES
+        except FileNotFoundError:
+            return False
+
+    @timed("CsvStorage.delete")
+    def delete(self, expense, expenses):
+        self.save(expenses)
+
+    def close(self):
+        if self.snapshot_file and self.save_snapshot and self.snapshot_stale:
+            write_snapshot(self.snapshot_file, self.data_file, self.expenses)
+            self.snapshot_stale = False
+
+
+class JournalStorage:
+    # Append-only ledger. Every line is "<crc32> <json record>", where a record
+    # is ["A", id, amount, description, category, date] for an added expense or
+    # ["D", id] for a deleted one. A line that was only partly written when the
+    # program crashed fails its checksum and is cut off the next time the
+    # journal is opened, so a crash can lose the last writes but never corrupts
+    # the ledger. With read_only=True the journal is only read: a missing one
+    # is loaded straight from the CSV and damaged lines are left in place.
+    def __init__(self, journal_file, csv_file=None, sync_every=64, compact_ratio=1.0, read_only=False):
+        self.journal_file = journal_file
+        self.path = journal_file
+        self.csv_file = csv_file
+        self.read_only = read_only
+        self.sync_every = sync_every
+        # Compact in the background once dead records outnumber live ones by this ratio
+        self.compact_ratio = compact_ratio
+        self.records = {}  # id -> expense, the live ledger
+        self.record_count = 0  # lines in the journal, live or not
+        self.unsynced = 0
+        self.lock = threading.Lock()
+        self.compactor = None
+        self.pending = None  # lines written while a compaction is running
+        self.file = None
+
+    @staticmethod
+    def encode(record):
+        data = json.dumps(record, separators=(',', ':')).encode()
+        return b"%08x %s\n" % (zlib.crc32(data), data)
+
+    @staticmethod
+    def decode(line):
+        # Returns the record, or None if the line is torn or damaged
+        if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+            return None
+        data = line[9:-1]
+        try:
+            if int(line[:8], 16) != zlib.crc32(data):
+                return None
+            return json.loads(data)
+        except ValueError:
+            return None
+
+    def load(self):
+        self.records = {}
+        self.record_count = 0
+        if not os.path.exists(self.journal_file) and self.csv_file and os.path.exists(self.csv_file):
+            # First use of the journal, start from the existing CSV ledger
+            expenses = CsvStorage(self.csv_file, save_snapshot=not self.read_only).load()
+            if self.read_only:
+                self.records = {expense['id']: expense for expense in expenses}
+                return list(expenses)
+            self.write_snapshot(expenses)
+        damaged = []  # complete lines that fail their checksum
+        if os.path.exists(self.journal_file):
+            size = 0
+            torn = None
+            with open(self.journal_file, 'rb') as file:
+                for line in file:
+                    size += len(line)
+                    record = self.decode(line)
+                    if record is None:
+                        if not line.endswith(b"\n"):
+                            # Only the last line can lack its newline: a write cut short by a crash
+                            torn = size - len(line)
+                        else:
+                            damaged.append(line)
+                        continue
+                    self.apply(record)
+                    self.record_count += 1
+            if self.read_only:
+                return list(self.records.values())
+            if torn is not None:
+                # Drop the torn tail so new records start on a clean line
+                with open(self.journal_file, 'r+b') as file:
+                    file.truncate(torn)
+                    os.fsync(file.fileno())
+            if damaged:
+                self.quarantine(damaged)
+        self.file = open(self.journal_file, 'ab')
+        if damaged:
+            # The damaged lines are kept in the quarantine file, rewrite the
+            # journal without them so they are not found again next time
+            self.compact()
+        return list(self.records.values())
+
+    def quarantine(self, lines):
+        # Damaged lines in the middle of the journal are skipped, never
+        # truncated away with the good records after them; their bytes are
+        # moved to <journal>.bad for inspection
+        bad_file = self.journal_file + ".bad"
+        with open(bad_file, 'ab') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        print(f"Skipped {len(lines)} damaged line(s) in {self.journal_file}, saved to {bad_file}")
+
+    @staticmethod
+    def add_record(expense):
+        return ["A", expense['id'], expense['amount'], expense['description'],
+                expense['category'], expense['date']]
+
+    def apply(self, record):
+        if record[0] == "A":
+            expense_id, amount, description, category, date = record[1:]
+            self.records[expense_id] = {
+                'amount': amount, 'description': description,
+                'category': category, 'date': date, 'id': expense_id
+            }
+        elif record[0] == "D":
+            self.records.pop(record[1], None)
+
+    def check_writable(self):
+        if self.read_only:
+            raise OSError(f"{self.journal_file} is open read-only")
+
+    def append(self, *records):
+        self.check_writable()
+        lines = [self.encode(record) for record in records]
+        with self.lock:
+            self.file.write(b"".join(lines))
+            self.file.flush()
+            self.record_count += len(lines)
+            if self.pending is not None:
+                self.pending.extend(lines)
+            self.unsynced += len(lines)
+            if self.unsynced >= self.sync_every:
+                self.sync()
+        if self.record_count - len(self.records) > self.compact_ratio * max(len(self.records), 1024):
+            self.compact(background=True)
+
+    def sync(self):
+        # fsync in batches, not after every record
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    @timed("JournalStorage.add")
+    def add(self, expense, expenses):
+        self.records[expense['id']] = expense
+        self.append(self.add_record(expense))
+
+    @timed("JournalStorage.add_many")
+    def add_many(self, new_expenses, expenses):
+        for expense in new_expenses:
+            self.records[expense['id']] = expense
+        self.append(*[self.add_record(expense) for expense in new_expenses])
+
+    @timed("JournalStorage.delete")
+    def delete(self, expense, expenses):
+        self.records.pop(expense['id'], None)
+        self.append(["D", expense['id']])
+
+    def save(self, expenses):
+        # A full save is a compaction down to the given expenses
+        self.check_writable()
+        self.wait_for_compaction()
+        with self.lock:
+            self.records = {expense['id']: expense for expense in expenses}
+            self.file.close()
+            self.write_snapshot(expenses)
+            self.record_count = len(expenses)
+            self.unsynced = 0
+            self.file = open(self.journal_file, 'ab')
+
+    def write_temp(self, expenses):
+        temp_file = self.journal_file + ".tmp"
+        with open(temp_file, 'wb') as file:
+            for expense in expenses:
+                file.write(self.encode(self.add_record(expense)))
+        return temp_file
+
+    def swap_in(self, temp_file, extra_lines=()):
+        # Atomically replace the journal with a fully synced new file
+        with open(temp_file, 'ab') as file:
+            for line in extra_lines:
+                file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.journal_file)
+        if hasattr(os, 'O_DIRECTORY'):
+            directory = os.path.dirname(os.path.abspath(self.journal_file))
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def write_snapshot(self, expenses):
+        self.swap_in(self.write_temp(expenses))
+
+    def compact(self, background=False):
+        # Rewrite the journal with only the live records. In the background the
+        # snapshot is written without holding the lock; records appended in the
+        # meantime are copied over before the new file is swapped in.
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        with self.lock:
+            live = list(self.records.values())
+            self.pending = []
+        if background:
+            self.compactor = threading.Thread(target=self._finish_compaction, args=(live,), daemon=True)
+            self.compactor.start()
+        else:
+            self._finish_compaction(live)
+
+    def _finish_compaction(self, live):
+        temp_file = self.write_temp(live)
+        with self.lock:
+            self.file.close()
+            self.swap_in(temp_file, self.pending)
+            self.record_count = len(live) + len(self.pending)
+            self.pending = None
+            self.unsynced = 0
+            self.file = open(self.journal_file, 'ab')
+
+    def wait_for_compaction(self):
+        if self.compactor is not None:
+            self.compactor.join()
+            self.compactor = None
+
+    def close(self):
+        self.wait_for_compaction()
+        if self.file is not None:
+            with self.lock:
+                self.sync()
+                self.file.close()
+                self.file = None
+
+
+def to_iso(date):
+    # 'DD-MM-YYYY' -> 'YYYY-MM-DD', which sorts and compares correctly as text
+    day, month, year = date.split('-')
+    return f"{year}-{month}-{day}"
+
+
+def from_iso(date):
+    year, month, day = date.split('-')
+    return f"{day}-{month}-{year}"
+
+
+class SqliteStorage:
+    # Expenses, categories and currency in one SQLite database. Summaries are
+    # answered by SQL aggregation over an index on date, so they only touch the
+    # rows in the requested period. With read_only=True an existing database is
+    # opened without creating any file next to it, and a missing one is built
+    # in memory from the CSV files instead of on disk.
+    def __init__(self, db_file, csv_file=None, category_file=None, currency_file=None, read_only=False):
+        self.db_file = db_file
+        self.path = db_file
+        self.read_only = read_only
+        is_new = not os.path.exists(db_file)
+        if read_only and not is_new:
+            # immutable=1 never creates the -wal and -shm files, but it also
+            # skips an existing -wal, so that case is opened plain read-only
+            mode = "ro" if os.path.exists(db_file + "-wal") else "ro&immutable=1"
+            self.connection = sqlite3.connect(f"file:{db_file}?mode={mode}", uri=True)
+            return
+        self.connection = sqlite3.connect(":memory:" if read_only else db_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS expenses ("
+            "  id INTEGER PRIMARY KEY, amount REAL NOT NULL, description TEXT NOT NULL,"
+            "  category TEXT NOT NULL, date TEXT NOT NULL);"
+            # Covering indexes, period and category summaries never read the table itself
+            "CREATE INDEX IF NOT EXISTS expenses_by_date ON expenses (date, category, amount);"
+            "CREATE INDEX IF NOT EXISTS expenses_by_category ON expenses (category, date, amount);"
+            "CREATE TABLE IF NOT EXISTS categories (position INTEGER PRIMARY KEY, name TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        if is_new and csv_file:
+            self.import_files(csv_file, category_file, currency_file)
+
+    def import_files(self, csv_file, category_file=None, currency_file=None):
+        # One-shot migration from the CSV ledger, category and currency files
+        with self.connection:
+            if os.path.exists(csv_file):
+                self.insert_many(CsvStorage(csv_file, save_snapshot=not self.read_only).load())
+            if category_file and os.path.exists(category_file):
+                with open(category_file, 'r') as file:
+                    self.write_categories([row[0] for row in csv.reader(file) if row])
+            if currency_file and os.path.exists(currency_file):
+                with open(currency_file, 'r') as file:
+                    self.write_currency(file.read().strip())
+
+    def insert_many(self, expenses):
+        self.connection.executemany(
+            "INSERT INTO expenses (id, amount, description, category, date) VALUES (?, ?, ?, ?, ?)",
+            ((int(e['id']), float(e['amount']), e['description'], e['category'], to_iso(e['date']))
+             for e in expenses)
+        )
+
+    def load(self):
+        return [
+            {'amount': amount, 'description': description, 'category': category,
+             'date': from_iso(date), 'id': str(expense_id)}
+            for expense_id, amount, description, category, date in self.connection.execute(
+                "SELECT id, amount, description, category, date FROM expenses ORDER BY id")
+        ]
+
+    def save(self, expenses):
+        with self.connection:
+            self.connection.execute("DELETE FROM expenses")
+            self.insert_many(expenses)
+
+    @timed("SqliteStorage.add")
+    def add(self, expense, expenses):
+        with self.connection:
+            self.insert_many([expense])
+
+    @timed("SqliteStorage.add_many")
+    def add_many(self, new_expenses, expenses):
+        with self.connection:
+            self.insert_many(new_expenses)
+
+    @timed("SqliteStorage.delete")
+    def delete(self, expense, expenses):
+        with self.connection:
+            self.connection.execute("DELETE FROM expenses WHERE id = ?", (int(expense['id']),))
+
+    def summarize(self, start_date=None, end_date=None):
+        # Summary of the expenses dated in [start_date, end_date], see expense_index.make_summary
+        query = "SELECT category, SUM(amount), COUNT(*) FROM expenses"
+        params = ()
+        if start_date and end_date:
+            query += " WHERE date BETWEEN ? AND ?"
+            params = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        # Categories come back in the order they were first used, like the CSV scan
+        query += " GROUP BY category ORDER BY MIN(id)"
+        return make_summary(
+            (category, round(amount * 100), rows)
+            for category, amount, rows in self.connection.execute(query, params)
+        )
+
+    def load_categories(self):
+        return [name for (name,) in self.connection.execute("SELECT name FROM categories ORDER BY position")]
+
+    def write_categories(self, categories):
+        self.connection.execute("DELETE FROM categories")
+        self.connection.executemany("INSERT INTO categories (position, name) VALUES (?, ?)",
+                                    enumerate(categories))
+
+    def save_categories(self, categories):
+        with self.connection:
+            self.write_categories(categories)
+
+    def load_currency(self):
+        row = self.connection.execute("SELECT value FROM settings WHERE key = 'currency'").fetchone()
+        return row[0] if row else None
+
+    def write_currency(self, currency):
+        self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('currency', ?)",
+                                (currency,))
+
+    def save_currency(self, currency):
+        with self.connection:
+            self.write_currency(currency)
+
+    def close(self):
+        self.connection.close()
+
+
+def make_storage(kind, data_file, category_file=None, currency_file=None, read_only=False):
+    # read_only backends read the ledger without creating or changing any file
+    if kind == "journal":
+        journal_file = os.path.splitext(data_file)[0] + ".journal"
+        return JournalStorage(journal_file, csv_file=data_file, read_only=read_only)
+    if kind == "sqlite":
+        db_file = os.path.splitext(data_file)[0] + ".db"
+        return SqliteStorage(db_file, data_file, category_file, currency_file, read_only=read_only)
+    return CsvStorage(data_file, save_snapshot=not read_only)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate an expense ledger to SQLite")
+    parser.add_argument("db_file")
+    parser.add_argument("--data-file", default="expenses.csv")
+    parser.add_argument("--category-file", default="categories.csv")
+    parser.add_argument("--currency-file", default="currency.txt")
+    args = parser.parse_args()
+    if os.path.exists(args.db_file):
+        print(f"{args.db_file} already exists, not migrating again.")
+        return
+    storage = SqliteStorage(args.db_file, args.data_file, args.category_file, args.currency_file)
+    count = storage.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    storage.close()
+    print(f"Migrated {count} expenses to {args.db_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import importlib
+import json
+import os
+import random
+import sqlite3
+from datetime import datetime
+
+from bitboard2048 import UndoHistory, pack_grid, unpack_grid
+from instrument import timed
+
+# The GUI-free game core. Nothing here imports tkinter, so headless workers,
+# bots and the terminal front end can use it; 2048.py holds the Tk GUI.
+
+
+class Game2048:
+    def __init__(self, history_size=100, seed=None):
+        # Per-game RNG, the same seed and moves always give the same game
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.grid = [[0] * 4 for _ in range(4)]
+        self.score = 0
+        # Bounded undo/redo history, one packed integer per board
+        self.history = UndoHistory(history_size)
+        self.add_new_tile()
+        self.add_new_tile()
+
+    @timed("Game2048.add_new_tile")
+    def add_new_tile(self):
+        empty_tiles = [(r, c) for r in range(4) for c in range(4) if self.grid[r][c] == 0]
+        if empty_tiles:
+            r, c = self.rng.choice(empty_tiles)
+            self.grid[r][c] = 2 if self.rng.random() < 0.9 else 4
+
+    @timed("Game2048.slide_left")
+    def slide_left(self):
+        moved = False
+        for row in self.grid:
+            tiles = [tile for tile in row if tile != 0]
+            for i in range(len(tiles) - 1):
+                if tiles[i] == tiles[i + 1]:
+                    tiles[i] *= 2
+                    self.score += tiles[i]
+                    tiles[i + 1] = 0
+            new_row = [tile for tile in tiles if tile != 0]
+            new_row += [0] * (4 - len(new_row))
+            if new_row != row:
+                moved = True
+            row[:] = new_row
+        return moved
+
+    def rotate_grid(self):
+        self.grid = [list(row) for row in zip(*self.grid[::-1])]
+
+    @timed("Game2048.move")
+    def move(self, direction):
+        snapshot = (pack_grid(self.grid), self.score)
+        moved = False
+        if direction == "Left":
+            moved = self.slide_left()
+        elif direction == "Right":
+            self.rotate_grid()
+            self.rotate_grid()
+            moved = self.slide_left()
+            self.rotate_grid()
+            self.rotate_grid()
+        elif direction == "Up":
+            self.rotate_grid()
+            self.rotate_grid()
+            self.rotate_grid()
+            moved = self.slide_left()
+            self.rotate_grid()
+        elif direction == "Down":
+            self.rotate_grid()
+            moved = self.slide_left()
+            self.rotate_grid()
+            self.rotate_grid()
+            self.rotate_grid()
+        if moved:
+            self.history.push(*snapshot)
+            self.add_new_tile()
+        return moved
+
+    def check_game_over(self):
+        if any(0 in row for row in self.grid):
+            return False
+        for row in self.grid:
+            for i in range(3):
+                if row[i] == row[i + 1]:
+                    return False
+        for col in range(4):
+            for row in range(3):
+                if self.grid[row][col] == self.grid[row + 1][col]:
+                    return False
+        return True
+
+    def save_state(self):
+        self.history.push(pack_grid(self.grid), self.score)
+
+    def undo(self, steps=1):
+        state = self.history.undo(pack_grid(self.grid), self.score, steps)
+        if state:
+            board, self.score = state
+            self.grid = unpack_grid(board)
+
+    def redo(self, steps=1):
+        state = self.history.redo(pack_grid(self.grid), self.score, steps)
+        if state:
+            board, self.score = state
+            self.grid = unpack_grid(board)
+
+
+class Leaderboard:
+    # Every finished game is one row in a SQLite database in WAL mode, so many
+    # game processes can append at the same time without clobbering each other
+    def __init__(self, file_path="leaderboard.db", legacy_file="leaderboard.json"):
+        self.file_path = file_path
+        # Autocommit, every INSERT is its own atomic transaction
+        self.connection = sqlite3.connect(file_path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "id INTEGER PRIMARY KEY, player TEXT NOT NULL, score INTEGER NOT NULL, "
+            "max_tile INTEGER, played_at TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_player ON scores (player, score DESC)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS scores_by_date ON scores (played_at)")
+        self.import_legacy(legacy_file)
+        self.highest_score = self.load_score()
+
+    def import_legacy(self, legacy_file):
+        # One-off import of the old single-number leaderboard.json
+        if not os.path.exists(legacy_file):
+            return
+        with open(legacy_file, 'r') as file:
+            scores = json.load(file)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            if self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 0:
+                self.connection.executemany(
+                    "INSERT INTO scores (player, score, played_at) VALUES ('legacy', ?, ?)",
+                    [(score, datetime.now().isoformat(timespec='seconds')) for score in scores]
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def load_score(self):
+        # MAX(score) is answered from the score index
+        row = self.connection.execute("SELECT MAX(score) FROM scores").fetchone()
+        return row[0] or 0
+
+    def refresh(self):
+        # Pick up high scores written by other processes
+        self.highest_score = self.load_score()
+        return self.highest_score
+
+    def add_score(self, score, player="anonymous", max_tile=None):
+        self.connection.execute(
+            "INSERT INTO scores (player, score, max_tile, played_at) VALUES (?, ?, ?, ?)",
+            (player, score, max_tile, datetime.now().isoformat(timespec='seconds'))
+        )
+        if score > self.highest_score:
+            self.highest_score = score
+
+    def top(self, k=10):
+        return self.connection.execute(
+            "SELECT player, score, max_tile, played_at FROM scores ORDER BY score DESC LIMIT ?", (k,)
+        ).fetchall()
+
+    def player_scores(self, player, k=10):
+        return self.connection.execute(
+            "SELECT player, score, max_tile, played_at FROM scores WHERE player = ? "
+            "ORDER BY score DESC LIMIT ?", (player, k)
+        ).fetchall()
+
+    def scores_on(self, day, k=10):
+        # day is a date or a 'YYYY-MM-DD' string; "~" sorts after any time of that day
+        day = str(day)
+        return self.connection.execute(
+            "SELECT player, score, max_tile, played_at FROM scores "
+            "WHERE played_at >= ? AND played_at < ? ORDER BY score DESC LIMIT ?",
+            (day, day + "~", k)
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def run_gui():
+    # tkinter is only imported when a window is actually wanted
+    importlib.import_module("2048").main()
+
+
+if __name__ == "__main__":
+    run_gui()
@@ -0,0 +1,262 @@
+import atexit
+import cProfile
+import functools
+import glob
+import importlib
+import json
+import multiprocessing.util
+import os
+import runpy
+import sys
+import time
+from contextlib import nullcontext
+
+# Opt-in timing for the hot paths of every tool. Nothing is measured unless
+# MOTIONCUT_INSTRUMENT is set when this module is first imported; then
+# @timed() returns the function itself and span() a shared no-op context,
+# so disabled instrumentation costs nothing per call.
+#
+#   MOTIONCUT_INSTRUMENT=metrics.json   counters and latency histograms are
+#                                       written there at exit, as Prometheus
+#                                       text when the name ends in .prom
+#                                       ("1" means instrument.json)
+#   MOTIONCUT_PROFILE=run.pstats        also run the whole program under
+#                                       cProfile and save the stats there
+#
+# python instrument.py [--out FILE] [--profile FILE] script.py [args...]
+# sets both for one run of a script.
+#
+# Worker processes of a multiprocessing pool count on their own. When one
+# exits it leaves its metrics in <output>.<main pid>-<worker pid>.worker and
+# the main process merges those files into its report at exit. A worker that
+# is killed instead of shut down is not counted; profiles only cover the
+# main process.
+OUTPUT = os.environ.get("MOTIONCUT_INSTRUMENT", "")
+if OUTPUT == "1":
+    OUTPUT = "instrument.json"
+ENABLED = bool(OUTPUT)
+PROFILE = os.environ.get("MOTIONCUT_PROFILE", "")
+BUCKETS = 40  # latency buckets, bucket i holds calls taking under 2**i ns
+
+metrics = {}
+
+
+class Metric:
+    # Calls, failures, total time and a log2 histogram of call durations
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.buckets = [0] * (BUCKETS + 1)  # the last one is everything slower
+
+    def reset(self):
+        self.calls = self.errors = self.total_ns = 0
+        self.buckets = [0] * (BUCKETS + 1)
+
+    def merge(self, calls, errors, total_ns, buckets):
+        self.calls += calls
+        self.errors += errors
+        self.total_ns += total_ns
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+
+    def observe(self, elapsed_ns, failed=False):
+        self.calls += 1
+        self.errors += failed
+        self.total_ns += elapsed_ns
+        self.buckets[min(elapsed_ns.bit_length(), BUCKETS)] += 1
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_seconds": self.total_ns / 1e9,
+            "mean_us": self.total_ns / self.calls / 1000 if self.calls else 0,
+            # upper bound of each non-empty bucket in microseconds -> calls
+            "histogram_us": {
+                ("inf" if i == BUCKETS else f"{2 ** i / 1000:g}"): count
+                for i, count in enumerate(self.buckets) if count
+            },
+        }
+
+
+def metric(name):
+    found = metrics.get(name)
+    if found is None:
+        found = metrics[name] = Metric(name)
+    return found
+
+
+def timed(name=None):
+    # Decorator recording every call of the function under name (its
+    # qualified name by default)
+    def decorate(func):
+        if not ENABLED:
+            return func
+        recorder = metric(name or f"{func.__module__}.{func.__qualname__}")
+        clock = time.perf_counter_ns
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                recorder.observe(clock() - start, True)
+                raise
+            recorder.observe(clock() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+class Span:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.recorder.observe(time.perf_counter_ns() - self.start, kind is not None)
+
+
+NULL_SPAN = nullcontext()
+
+
+def span(name):
+    # with span("name"): ... times a block the same way @timed times a call
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(metric(name))
+
+
+def prometheus_text():
+    lines = []
+    for name, recorder in sorted(metrics.items()):
+        metric_name = "motioncut_" + "".join(c if c.isalnum() else "_" for c in name) + "_seconds"
+        lines.append(f"# TYPE {metric_name} histogram")
+        cumulative = 0
+        for i, count in enumerate(recorder.buckets[:BUCKETS]):
+            cumulative += count
+            if count:
+                lines.append(f'{metric_name}_bucket{{le="{2 ** i / 1e9:g}"}} {cumulative}')
+        lines.append(f'{metric_name}_bucket{{le="+Inf"}} {recorder.calls}')
+        lines.append(f"{metric_name}_sum {recorder.total_ns / 1e9:.9f}")
+        lines.append(f"{metric_name}_count {recorder.calls}")
+        lines.append(f"# TYPE {metric_name[:-len('_seconds')]}_errors_total counter")
+        lines.append(f"{metric_name[:-len('_seconds')]}_errors_total {recorder.errors}")
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    # Writes a snapshot of every metric; callers may do this any time
+    path = path or OUTPUT
+    temp_file = path + ".tmp"
+    with open(temp_file, 'w') as file:
+        if path.endswith(".prom"):
+            file.write(prometheus_text())
+        else:
+            json.dump({
+                "pid": os.getpid(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "metrics": {name: recorder.snapshot() for name, recorder in sorted(metrics.items())},
+            }, file, indent=2)
+    os.replace(temp_file, path)
+
+
+worker_pid = None  # set in a worker process once it is counting for itself
+worker_finalizer = None
+
+
+def start_worker(_=None):
+    # Runs when a multiprocessing worker starts: forget what a forked copy
+    # inherited from its parent and save the metrics when the worker exits
+    global worker_pid, worker_finalizer
+    if worker_pid != os.getpid():
+        worker_pid = os.getpid()
+        for recorder in metrics.values():
+            recorder.reset()
+    # Workers leave through multiprocessing's own exit path, which skips
+    # atexit, and it drops handlers registered before the worker started
+    if worker_finalizer is None or not worker_finalizer.still_active():
+        worker_finalizer = multiprocessing.util.Finalize(None, save_worker_metrics, exitpriority=10)
+
+
+def save_worker_metrics():
+    used = {name: [recorder.calls, recorder.errors, recorder.total_ns, recorder.buckets]
+            for name, recorder in metrics.items() if recorder.calls}
+    if not used:
+        return
+    root = os.environ.get("MOTIONCUT_INSTRUMENT_ROOT", "")
+    path = f"{OUTPUT}.{root}-{os.getpid()}.worker"
+    with open(path + ".tmp", 'w') as file:
+        json.dump(used, file)
+    os.replace(path + ".tmp", path)
+
+
+def merge_workers():
+    # Adds the metrics left behind by this process's workers and removes their files
+    for path in glob.glob(glob.escape(f"{OUTPUT}.{os.getpid()}-") + "*.worker"):
+        try:
+            with open(path, 'r') as file:
+                used = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, (calls, errors, total_ns, buckets) in used.items():
+            metric(name).merge(calls, errors, total_ns, buckets)
+        os.remove(path)
+
+
+def at_exit(pid, profiler):
+    # Forked processes inherit this hook; only the process that set it up reports
+    if os.getpid() != pid:
+        return
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(PROFILE)
+    if ENABLED:
+        merge_workers()
+        if metrics:
+            dump()
+
+
+if (ENABLED or PROFILE) and __name__ != "__main__":
+    profiler = None
+    if PROFILE:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    atexit.register(at_exit, os.getpid(), profiler)
+    if ENABLED:
+        if multiprocessing.current_process().name == "MainProcess":
+            # Workers find the files to write for this process through the
+            # environment. A spawned worker already has its own name when it
+            # imports this module, before its parent_process() is known.
+            os.environ["MOTIONCUT_INSTRUMENT_ROOT"] = str(os.getpid())
+        else:
+            start_worker()
+        multiprocessing.util.register_after_fork(start_worker, start_worker)
+
+
+def main():
+    # Runs a script with instrumentation on. The settings go into the
+    # environment and this file is imported again as "instrument", the copy
+    # the script's modules will share, so profiling starts before the script.
+    args = sys.argv[1:]
+    options = {"--out": "MOTIONCUT_INSTRUMENT", "--profile": "MOTIONCUT_PROFILE"}
+    os.environ.setdefault("MOTIONCUT_INSTRUMENT", "instrument.json")
+    while args and args[0] in options and len(args) > 1:
+        os.environ[options[args[0]]] = args[1]
+        args = args[2:]
+    if not args or args[0].startswith("-"):
+        print("usage: python instrument.py [--out FILE] [--profile FILE] script.py [args...]")
+        sys.exit(2)
+    importlib.import_module("instrument")
+    sys.argv = args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args[0])))
+    runpy.run_path(args[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
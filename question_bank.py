@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import random
+import struct
+from array import array
+from functools import lru_cache
+
+# A question bank is a JSONL file with one question per line, in the format
+# week1.get_questions uses plus an optional topic:
+#   {"question": "...", "options": ["A. ...", ...], "answer": "B", "topic": "networks"}
+# The bank is read once to build an index of line offsets and topics, saved
+# next to it as <bank>.idx and trusted while the bank keeps the size and
+# modification time recorded in it. Sampling only touches the index; the
+# chosen questions are read by seeking to their line. Lines missing a
+# question, options or an answer naming one of the options are left out of
+# the index and reported, so they can't break a quiz halfway through.
+#
+# Index layout: header (magic, bank size, bank mtime (ns), questions, meta
+# JSON size), {"topics": [names], "rejected": [[line, reason], ...]} as JSON,
+# array('Q') offset of every question, array('H') topic code of every question.
+MAGIC = b"QBANKID2"
+HEADER = struct.Struct("<8sQqQQ")
+CACHE_SIZE = 4096  # parsed questions kept in memory
+MAX_TOPICS = 1 << 16  # topic codes are stored as array('H')
+
+
+def bank_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def question_problem(question):
+    # Why a parsed line can't be asked as a question, or None when it can
+    if not isinstance(question.get("question"), str):
+        return "no question text"
+    options = question.get("options")
+    if not isinstance(options, list) or not options or not all(isinstance(option, str) for option in options):
+        return "no list of options"
+    answer = question.get("answer")
+    if not isinstance(answer, str) or answer not in [option.split(".", 1)[0].strip() for option in options]:
+        return f"answer {answer!r} is not one of the options"
+    return None
+
+
+class QuestionBank:
+    def __init__(self, path, cache_size=CACHE_SIZE):
+        self.path = path
+        self.index_file = path + ".idx"
+        self.offsets = array('Q')
+        self.codes = array('H')
+        self.topics = []
+        self.rejected = []  # (line number, reason) of the lines left out
+        self.topic_rows = {}  # topic -> question numbers, built on first use
+        if not self.load_index():
+            self.build_index()
+            self.save_index()
+        if self.rejected:
+            shown = ", ".join(f"line {line_number} ({reason})" for line_number, reason in self.rejected[:5])
+            more = f" and {len(self.rejected) - 5} more" if len(self.rejected) > 5 else ""
+            print(f"Skipped {len(self.rejected)} malformed question(s) in {path}: {shown}{more}")
+        self.file = open(path, 'rb')
+        # Parsed questions are cached and shared, get() hands out copies
+        self.read_question = lru_cache(maxsize=cache_size)(self.read_question)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def build_index(self):
+        topic_codes = {}
+        offset = 0
+        with open(self.path, 'rb') as file:
+            for line_number, line in enumerate(file, start=1):
+                line_start = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    question = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"{self.path}: line {line_number} is not valid JSON")
+                if not isinstance(question, dict):
+                    raise ValueError(f"{self.path}: line {line_number} is not a JSON object")
+                problem = question_problem(question)
+                if problem:
+                    self.rejected.append((line_number, problem))
+                    continue
+                topic = question.get("topic", "")
+                if not isinstance(topic, str):
+                    raise ValueError(f"{self.path}: line {line_number} has a topic that is not a string")
+                if topic not in topic_codes and len(topic_codes) == MAX_TOPICS:
+                    raise ValueError(f"{self.path}: line {line_number} adds a topic past the maximum of {MAX_TOPICS}")
+                self.offsets.append(line_start)
+                self.codes.append(topic_codes.setdefault(topic, len(topic_codes)))
+        self.topics = list(topic_codes)
+
+    def save_index(self):
+        meta = json.dumps({"topics": self.topics, "rejected": self.rejected}).encode()
+        size, mtime = bank_stamp(self.path)
+        temp_file = self.index_file + ".tmp"
+        try:
+            with open(temp_file, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, size, mtime, len(self.codes), len(meta)))
+                file.write(meta)
+                self.offsets.tofile(file)
+                self.codes.tofile(file)
+            os.replace(temp_file, self.index_file)
+        except OSError:
+            pass  # The bank still works, it is just indexed again next time
+
+    def load_index(self):
+        # Returns False when there is no index or it belongs to another version of the bank
+        try:
+            with open(self.index_file, 'rb') as file:
+                magic, size, mtime, count, meta_size = HEADER.unpack(file.read(HEADER.size))
+                if magic != MAGIC or (size, mtime) != bank_stamp(self.path):
+                    return False
+                meta = json.loads(file.read(meta_size))
+                self.topics = meta["topics"]
+                self.rejected = [tuple(entry) for entry in meta["rejected"]]
+                self.offsets.fromfile(file, count)
+                self.codes.fromfile(file, count)
+        except (OSError, EOFError, ValueError, KeyError, TypeError, struct.error):
+            self.offsets = array('Q')
+            self.codes = array('H')
+            self.topics = []
+            self.rejected = []
+            return False
+        return True
+
+    def read_question(self, number):
+        self.file.seek(self.offsets[number])
+        question = json.loads(self.file.readline())
+        question.setdefault("topic", self.topics[self.codes[number]])
+        return question
+
+    def get(self, number):
+        # A copy, so a session changing its question can't change anyone else's
+        question = self.read_question(number)
+        return dict(question, options=list(question["options"]))
+
+    def rows_for(self, topic):
+        rows = self.topic_rows.get(topic)
+        if rows is None:
+            if topic not in self.topics:
+                raise ValueError(f"No questions with topic '{topic}', the topics are {self.topics}")
+            code = self.topics.index(topic)
+            rows = self.topic_rows[topic] = array('L', (i for i, c in enumerate(self.codes) if c == code))
+        return rows
+
+    def sample(self, count, topic=None, rng=random):
+        # count different question numbers at random, all of them when the bank is smaller
+        rows = range(len(self)) if topic is None else self.rows_for(topic)
+        return rng.sample(rows, min(count, len(rows)))
+
+    def quiz(self, count, topic=None, rng=random):
+        # The questions of one quiz, ready for week1.ask_question
+        return [self.get(number) for number in self.sample(count, topic, rng)]
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and sample a JSONL question bank")
+    parser.add_argument("bank")
+    parser.add_argument("--count", type=int, default=10, help="questions to sample")
+    parser.add_argument("--topic", help="only sample questions with this topic")
+    parser.add_argument("--topics", action="store_true", help="list the topics and their sizes instead")
+    args = parser.parse_args()
+
+    try:
+        bank = QuestionBank(args.bank)
+    except (OSError, ValueError) as error:
+        print(f"Error: {error}")
+        return
+    print(f"{len(bank)} questions in {len(bank.topics)} topics")
+    if args.topics:
+        for topic in bank.topics:
+            print(f"  {topic or '(none)'}: {len(bank.rows_for(topic))}")
+        return
+    try:
+        questions = bank.quiz(args.count, args.topic)
+    except ValueError as error:
+        print(f"Error: {error}")
+        return
+    for question_data in questions:
+        print(f"[{question_data['topic']}] {question_data['question']} ({question_data['answer']})")
+
+
+if __name__ == "__main__":
+    main()
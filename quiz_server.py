@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import random
+import time
+
+from question_bank import QuestionBank
+from week1 import CORRECT_POINTS, VALID_ANSWERS, get_questions, is_valid_answer, score_answer
+
+# Line protocol, UTF-8, one message per line. The server sends
+#   WELCOME <questions>
+#   QUESTION <number>/<questions> <text>
+#   OPTION <option>                    (one per option)
+#   ASK                                the client answers with A, B, C or D
+#   CORRECT <points> <score>  |  WRONG <correct answer> <points> <score>
+#   INVALID                            and ASK again, for anything else
+#   DONE <score> <max score>
+# The client may send QUIT instead of an answer. A session is closed with
+# TIMEOUT when an answer or the whole quiz takes too long.
+ANSWER_TIMEOUT = 60
+SESSION_TIMEOUT = 900
+
+
+class QuizServer:
+    def __init__(self, questions=None, answer_timeout=ANSWER_TIMEOUT, session_timeout=SESSION_TIMEOUT):
+        # questions() returns the questions of a new session, see week1.get_questions
+        self.questions = questions or get_questions
+        self.answer_timeout = answer_timeout
+        self.session_timeout = session_timeout
+        self.active = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8048):
+        self.server = await asyncio.start_server(self.handle_client, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle_client(self, reader, writer):
+        self.active += 1
+        try:
+            await asyncio.wait_for(self.run_session(reader, writer), self.session_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            writer.write(b"TIMEOUT\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def run_session(self, reader, writer):
+        # All state of one player lives here, sessions share nothing
+        questions = self.questions()
+        score = 0
+        send = writer.write
+        send(f"WELCOME {len(questions)}\n".encode())
+        for number, question_data in enumerate(questions, start=1):
+            # The question text starts with its number in the bank, so send it as is
+            send(f"QUESTION {number}/{len(questions)} {question_data['question']}\n".encode())
+            for option in question_data["options"]:
+                send(f"OPTION {option}\n".encode())
+            while True:
+                send(b"ASK\n")
+                await writer.drain()
+                line = await asyncio.wait_for(reader.readline(), self.answer_timeout)
+                if not line:
+                    return
+                answer = line.decode(errors="replace").strip().upper()
+                if answer == "QUIT":
+                    return
+                if is_valid_answer(answer):
+                    break
+                send(b"INVALID\n")
+            points = score_answer(answer, question_data["answer"])
+            score += points
+            if points > 0:
+                send(f"CORRECT {points} {score}\n".encode())
+            else:
+                send(f"WRONG {question_data['answer']} {points} {score}\n".encode())
+        send(f"DONE {score} {len(questions) * CORRECT_POINTS}\n".encode())
+        await writer.drain()
+        self.completed += 1
+
+
+async def play_session(host, port, rng, latencies):
+    # One scripted player answering at random. Appends the time from sending
+    # each answer to receiving the server's reply to latencies.
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line or line.startswith((b"DONE", b"TIMEOUT")):
+                return line.startswith(b"DONE")
+            if line == b"ASK\n":
+                writer.write(rng.choice(VALID_ANSWERS).encode() + b"\n")
+                sent = time.perf_counter()
+                await writer.drain()
+                await reader.readline()
+                latencies.append(time.perf_counter() - sent)
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0
+    rank = max(1, min(len(sorted_values), round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def bank_questions(path, count, topic=None):
+    # A questions() callable for QuizServer: every session draws its own
+    # random questions from the bank, copies of the parsed ones in its cache
+    bank = QuestionBank(path)
+    if topic:
+        bank.rows_for(topic)  # Fail early on an unknown topic
+    return lambda: bank.quiz(count, topic)
+
+
+async def load_test(sessions, concurrency, host=None, port=0, seed=0, questions=None):
+    # Plays sessions quizzes with at most concurrency of them at once, against
+    # host:port or, without host, a server started here. Returns the results.
+    server = None
+    if host is None:
+        server = QuizServer(questions)
+        host = "127.0.0.1"
+        port = await server.start(host, port)
+    rng = random.Random(seed)
+    latencies = []
+    finished = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one_session():
+        nonlocal finished
+        async with limit:
+            if await play_session(host, port, rng, latencies):
+                finished += 1
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_session() for _ in range(sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        await server.close()
+    latencies.sort()
+    return {
+        "sessions": sessions,
+        "completed": finished,
+        "errors": sum(1 for result in results if isinstance(result, Exception)),
+        "seconds": elapsed,
+        "sessions_per_sec": finished / elapsed,
+        "answers": len(latencies),
+        "latency_ms": {f"p{p}": percentile(latencies, p) * 1000 for p in (50, 90, 99)},
+    }
+
+
+async def serve(host, port, answer_timeout, session_timeout, questions=None):
+    server = QuizServer(questions, answer_timeout, session_timeout)
+    port = await server.start(host, port)
+    print(f"Quiz server listening on {host}:{port}")
+    async with server.server:
+        await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the week1 quiz to many players over TCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    server = commands.add_parser("serve", help="run the quiz server")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8048)
+    server.add_argument("--answer-timeout", type=float, default=ANSWER_TIMEOUT, help="seconds to answer a question")
+    server.add_argument("--session-timeout", type=float, default=SESSION_TIMEOUT, help="seconds for a whole quiz")
+    tester = commands.add_parser("loadtest", help="play many scripted sessions and report throughput")
+    tester.add_argument("--sessions", type=int, default=1000)
+    tester.add_argument("--concurrency", type=int, default=200, help="sessions open at the same time")
+    tester.add_argument("--host", help="server to test, a local one is started when not given")
+    tester.add_argument("--port", type=int, default=8048)
+    tester.add_argument("--seed", type=int, default=0)
+    for command in (server, tester):
+        command.add_argument("--bank", help="JSONL question bank to draw each session's questions from")
+        command.add_argument("--count", type=int, default=10, help="questions per session from the bank")
+        command.add_argument("--topic", help="only draw questions with this topic")
+    args = parser.parse_args()
+
+    questions = None
+    if args.bank:
+        try:
+            questions = bank_questions(args.bank, args.count, args.topic)
+        except (OSError, ValueError) as error:
+            print(f"Error: {error}")
+            return
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.answer_timeout, args.session_timeout, questions))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    port = args.port if args.host else 0
+    result = asyncio.run(load_test(args.sessions, args.concurrency, args.host, port, args.seed, questions))
+    latency = result["latency_ms"]
+    print(f"{result['completed']}/{result['sessions']} sessions in {result['seconds']:.2f}s "
+          f"({result['sessions_per_sec']:,.1f} sessions/sec, {result['errors']} errors)")
+    print(f"Answer latency over {result['answers']} answers: p50 {latency['p50']:.2f} ms, "
+          f"p90 {latency['p90']:.2f} ms, p99 {latency['p99']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
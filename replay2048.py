@@ -0,0 +1,191 @@
+import argparse
+import random
+import struct
+
+import bitboard2048
+from bitboard2048 import DIRECTIONS, move_board, pack_grid
+
+# A replay is a fixed header, one byte per move and a keyframe table:
+#   header   magic, version, has_seed, seed, initial board, move count, keyframe interval
+#   move     bits 0-1 direction, bits 2-5 spawned cell, bit 6 set if the spawn was a 4
+#   keyframe board and score after every keyframe_interval moves
+# Only moves that changed the board are recorded, and every such move spawns a tile.
+MAGIC = b"R2K"
+VERSION = 1
+HEADER = struct.Struct("<3sBBQQIH")
+KEYFRAME = struct.Struct("<QI")
+MAX_KEYFRAME_INTERVAL = 0xFFFF  # stored as an unsigned short
+
+
+def check_keyframe_interval(interval):
+    if not 1 <= interval <= MAX_KEYFRAME_INTERVAL:
+        raise ValueError(f"keyframe_interval must be between 1 and {MAX_KEYFRAME_INTERVAL}, got {interval}")
+
+
+def encode_move(direction_index, cell, exponent):
+    return direction_index | (cell << 2) | ((exponent - 1) << 6)
+
+
+def apply_move(board, score, code):
+    # Replays one recorded move without any randomness
+    new_board, gained = move_board(board, DIRECTIONS[code & 3])
+    cell = (code >> 2) & 0xF
+    new_board |= (((code >> 6) & 1) + 1) << (4 * cell)
+    return new_board, score + gained
+
+
+class ReplayRecorder:
+    # Wraps a Game2048/BitboardGame2048 and logs every move that changed the board
+    def __init__(self, game, keyframe_interval=64):
+        check_keyframe_interval(keyframe_interval)
+        bitboard2048.build_tables()
+        self.game = game
+        self.keyframe_interval = keyframe_interval
+        self.seed = getattr(game, "seed", None)
+        self.initial_board = self.current_board()
+        self.moves = bytearray()
+        self.keyframes = []
+
+    def current_board(self):
+        return self.game.board if hasattr(self.game, "board") else pack_grid(self.game.grid)
+
+    def move(self, direction):
+        before = self.current_board()
+        moved = self.game.move(direction)
+        if moved:
+            slid = move_board(before, direction)[0]
+            after = self.current_board()
+            # The only difference between the slid board and the new board is the spawn
+            diff = after ^ slid
+            cell = (diff.bit_length() - 1) // 4
+            exponent = (after >> (4 * cell)) & 0xF
+            self.moves.append(encode_move(DIRECTIONS.index(direction), cell, exponent))
+            if len(self.moves) % self.keyframe_interval == 0:
+                self.keyframes.append((after, self.game.score))
+        return moved
+
+    def to_replay(self):
+        return Replay(self.seed, self.initial_board, bytes(self.moves),
+                      list(self.keyframes), self.keyframe_interval)
+
+    def to_bytes(self):
+        return self.to_replay().to_bytes()
+
+
+class Replay:
+    def __init__(self, seed, initial_board, moves, keyframes, keyframe_interval=64):
+        check_keyframe_interval(keyframe_interval)
+        self.seed = seed
+        self.initial_board = initial_board
+        self.moves = moves
+        self.keyframes = keyframes
+        self.keyframe_interval = keyframe_interval
+
+    def __len__(self):
+        return len(self.moves)
+
+    def to_bytes(self):
+        has_seed = self.seed is not None
+        seed = (self.seed if has_seed else 0) & 0xFFFFFFFFFFFFFFFF
+        parts = [HEADER.pack(MAGIC, VERSION, has_seed, seed, self.initial_board,
+                             len(self.moves), self.keyframe_interval), self.moves]
+        parts.extend(KEYFRAME.pack(board, score) for board, score in self.keyframes)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        # Returns (replay, offset just past it), so records can be read back to back
+        magic, version, has_seed, seed, initial_board, count, interval = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION or interval < 1:
+            raise ValueError("Not a 2048 replay record")
+        offset += HEADER.size
+        moves = bytes(data[offset:offset + count])
+        offset += count
+        keyframes = []
+        for _ in range(count // interval):
+            keyframes.append(KEYFRAME.unpack_from(data, offset))
+            offset += KEYFRAME.size
+        replay = cls(seed if has_seed else None, initial_board, moves, keyframes, interval)
+        return replay, offset
+
+    def state_at(self, n):
+        # Board and score after the first n moves, starting from the nearest keyframe
+        n = max(0, min(n, len(self.moves)))
+        k = n // self.keyframe_interval
+        if k:
+            board, score = self.keyframes[k - 1]
+        else:
+            board, score = self.initial_board, 0
+        for code in self.moves[k * self.keyframe_interval:n]:
+            board, score = apply_move(board, score, code)
+        return board, score
+
+    def frames(self, start=0):
+        # Yields (move number, board, score) from move start to the end
+        board, score = self.state_at(start)
+        yield start, board, score
+        for i in range(start, len(self.moves)):
+            board, score = apply_move(board, score, self.moves[i])
+            yield i + 1, board, score
+
+    def final_state(self):
+        return self.state_at(len(self.moves))
+
+
+def write_replays(path, replays, append=True):
+    with open(path, 'ab' if append else 'wb') as file:
+        for replay in replays:
+            file.write(replay.to_bytes())
+
+
+def read_replays(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    offset = 0
+    while offset < len(data):
+        replay, offset = Replay.from_bytes(data, offset)
+        yield replay
+
+
+def record_random_games(count, seed=0, keyframe_interval=64):
+    bitboard2048.build_tables()
+    policy = random.Random(seed)
+    for i in range(count):
+        recorder = ReplayRecorder(bitboard2048.BitboardGame2048(seed=seed + i), keyframe_interval)
+        while not recorder.game.check_game_over():
+            recorder.move(policy.choice(DIRECTIONS))
+        yield recorder.to_replay()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and inspect 2048 replays")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="record random games")
+    record.add_argument("file")
+    record.add_argument("--games", type=int, default=100)
+    record.add_argument("--seed", type=int, default=0)
+    show = commands.add_parser("show", help="show a game at a given move")
+    show.add_argument("file")
+    show.add_argument("--game", type=int, default=0)
+    show.add_argument("--move", type=int, default=None, help="defaults to the last move")
+    args = parser.parse_args()
+
+    bitboard2048.build_tables()
+    if args.command == "record":
+        write_replays(args.file, record_random_games(args.games, args.seed), append=False)
+        print(f"Recorded {args.games} games to {args.file}")
+    else:
+        for i, replay in enumerate(read_replays(args.file)):
+            if i == args.game:
+                n = len(replay) if args.move is None else args.move
+                board, score = replay.state_at(n)
+                print(f"Game {i} (seed {replay.seed}), move {n} of {len(replay)}, score {score}")
+                for row in bitboard2048.unpack_grid(board):
+                    print(" ".join(f"{value:5}" for value in row))
+                break
+        else:
+            print(f"No game {args.game} in {args.file}")
+
+
+if __name__ == "__main__":
+    main()
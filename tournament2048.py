@@ -0,0 +1,202 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bitboard2048
+from bitboard2048 import DIRECTIONS, move_board, pack_grid
+from game2048 import Game2048
+
+# A policy is any callable policy(game, rng) -> direction, where game is a
+# Game2048 or BitboardGame2048 and rng is the policy's own random.Random,
+# seeded separately from the game's tile spawns so the two never correlate.
+
+
+def board_of(game):
+    return game.board if hasattr(game, "board") else pack_grid(game.grid)
+
+
+def random_policy(game, rng):
+    return rng.choice(DIRECTIONS)
+
+
+def greedy_policy(game, rng):
+    # Take the move that scores the most right now, then the one leaving most empty cells
+    board = board_of(game)
+    best, best_key = None, None
+    for direction in DIRECTIONS:
+        new_board, gained = move_board(board, direction)
+        if new_board == board:
+            continue
+        key = (gained, bitboard2048.count_empty(new_board), rng.random())
+        if best_key is None or key > best_key:
+            best, best_key = direction, key
+    return best or DIRECTIONS[0]
+
+
+def corner_policy(game, rng):
+    # Keep the big tiles in the bottom-left corner, only go Up when nothing else moves
+    board = board_of(game)
+    for direction in ("Down", "Left", "Right", "Up"):
+        if move_board(board, direction)[0] != board:
+            return direction
+    return "Down"
+
+
+def expectimax_policy(game, rng):
+    import ai2048
+    return ai2048.best_move(game, time_budget=0.01) or DIRECTIONS[0]
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "corner": corner_policy,
+    "expectimax": expectimax_policy,
+}
+
+
+def load_policy(name):
+    # A built-in policy name, "module:function" for any importable callable,
+    # or the policy callable itself
+    if callable(name):
+        return name
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"Unknown policy '{name}', use one of {sorted(POLICIES)} or module:function")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def make_game(engine, seed):
+    if engine == "bitboard":
+        return bitboard2048.BitboardGame2048(seed=seed)
+    return Game2048(seed=seed)
+
+
+def play_games(policy_name, engine, seeds, max_moves=100000):
+    # Runs in a worker process; returns one result dict per seed
+    bitboard2048.build_tables()
+    policy = load_policy(policy_name)
+    results = []
+    for seed in seeds:
+        game = make_game(engine, seed)
+        rng = random.Random(f"policy-{seed}")
+        moves = 0
+        while moves < max_moves and not game.check_game_over():
+            if not game.move(policy(game, rng)):
+                # A policy that keeps picking a move that changes nothing would never finish
+                board = board_of(game)
+                game.move(rng.choice([d for d in DIRECTIONS if move_board(board, d)[0] != board]))
+            moves += 1
+        results.append({
+            "seed": seed,
+            "score": game.score,
+            "max_tile": bitboard2048.max_tile(board_of(game)),
+            "moves": moves,
+        })
+    return results
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0
+    rank = max(1, min(len(sorted_values), round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(results):
+    scores = sorted(result["score"] for result in results)
+    moves = sorted(result["moves"] for result in results)
+    tiles = Counter(result["max_tile"] for result in results)
+    return {
+        "games": len(results),
+        "score": {
+            "mean": sum(scores) / len(scores),
+            **{f"p{p}": percentile(scores, p) for p in (10, 25, 50, 75, 90, 99)},
+            "max": scores[-1],
+        },
+        "moves_per_game": {
+            "mean": sum(moves) / len(moves),
+            "p50": percentile(moves, 50),
+            "max": moves[-1],
+        },
+        "max_tile": {str(tile): tiles[tile] for tile in sorted(tiles)},
+    }
+
+
+def policy_name(policy):
+    if isinstance(policy, str):
+        return policy
+    return f"{policy.__module__}:{policy.__qualname__}"
+
+
+def run_tournament(policy, games, engine="bitboard", workers=None, seed=0, chunk_size=None, progress=True):
+    # policy is anything load_policy accepts; a callable has to be picklable,
+    # i.e. a module level function, to reach the worker processes
+    if games < 1:
+        raise ValueError("A tournament needs at least one game")
+    workers = workers or os.cpu_count() or 1
+    # Small chunks keep results streaming back, big enough to hide the pool overhead
+    chunk_size = chunk_size or max(1, min(50, games // (workers * 8) or 1))
+    seeds = list(range(seed, seed + games))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(play_games, policy, engine, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            results.extend(future.result())
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"\r{len(results)}/{games} games, {len(results) / elapsed:,.1f} games/sec",
+                      end="", flush=True)
+    if progress:
+        print()
+    summary = summarize(results)
+    summary["policy"] = policy_name(policy)
+    summary["engine"] = engine
+    summary["workers"] = workers
+    summary["seconds"] = time.perf_counter() - start
+    summary["games_per_sec"] = games / summary["seconds"]
+    return summary, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless 2048 games and aggregate the results")
+    parser.add_argument("--policy", default="random",
+                        help=f"one of {', '.join(POLICIES)} or module:function")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--engine", choices=["bitboard", "list"], default="bitboard")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--out", help="write the summary and per-game results as JSON")
+    args = parser.parse_args()
+
+    if args.games < 1:
+        print("Error: --games must be at least 1")
+        return
+    load_policy(args.policy)  # Fail early on a bad policy name
+    summary, results = run_tournament(args.policy, args.games, args.engine, args.workers, args.seed)
+    score = summary["score"]
+    print(f"{summary['games']} games with the {args.policy} policy in {summary['seconds']:.1f}s "
+          f"({summary['games_per_sec']:,.1f} games/sec on {summary['workers']} workers)")
+    print(f"Score: mean {score['mean']:.0f}, p10 {score['p10']}, p50 {score['p50']}, "
+          f"p90 {score['p90']}, p99 {score['p99']}, max {score['max']}")
+    print(f"Moves per game: mean {summary['moves_per_game']['mean']:.0f}, max {summary['moves_per_game']['max']}")
+    print("Max tile reached:")
+    for tile, count in summary["max_tile"].items():
+        print(f"  {tile:>6}: {count} ({count / summary['games']:.1%})")
+    if args.out:
+        with open(args.out, 'w') as file:
+            json.dump({"summary": summary, "games": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
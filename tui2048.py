@@ -0,0 +1,75 @@
+import argparse
+import curses
+
+from bitboard2048 import BitboardGame2048
+from game2048 import Game2048, Leaderboard
+
+KEYS = {
+    curses.KEY_LEFT: "Left", curses.KEY_RIGHT: "Right",
+    curses.KEY_UP: "Up", curses.KEY_DOWN: "Down",
+    ord("a"): "Left", ord("d"): "Right", ord("w"): "Up", ord("s"): "Down",
+}
+HELP = "arrows/wasd: move  u: undo  r: redo  h: hint  n: new game  q: quit"
+
+
+def draw(screen, game, leaderboard, message=""):
+    screen.erase()
+    screen.addstr(0, 0, f"2048    Score: {game.score}    Best: {leaderboard.highest_score}")
+    grid = game.grid
+    for r, row in enumerate(grid):
+        screen.addstr(2 + 2 * r, 0, "+------" * 4 + "+")
+        screen.addstr(3 + 2 * r, 0, "".join(f"|{value if value else '':^6}" for value in row) + "|")
+    screen.addstr(10, 0, "+------" * 4 + "+")
+    screen.addstr(12, 0, HELP)
+    if message:
+        screen.addstr(13, 0, message)
+    screen.refresh()
+
+
+def play(screen, make_game):
+    curses.curs_set(0)
+    leaderboard = Leaderboard()
+    game = make_game()
+    ai = None
+    message = ""
+    recorded = False
+    while True:
+        over = game.check_game_over()
+        if over and not recorded:
+            leaderboard.add_score(game.score, max_tile=max(max(row) for row in game.grid))
+            recorded = True
+            message = f"Game over! Your score: {game.score}. Press n for a new game or q to quit."
+        draw(screen, game, leaderboard, message)
+        key = screen.getch()
+        message = "" if not over else message
+        if key == ord("q"):
+            break
+        elif key in KEYS and not over:
+            game.move(KEYS[key])
+        elif key == ord("u"):
+            game.undo()
+        elif key == ord("r"):
+            game.redo()
+        elif key == ord("n"):
+            game = make_game()
+            recorded = False
+            message = ""
+        elif key == ord("h") and not over:
+            if ai is None:
+                import ai2048
+                ai = ai2048.ExpectimaxAI()
+            message = f"Hint: {ai.best_move(game, time_budget=0.1)} ({ai.report()})"
+    leaderboard.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play 2048 in the terminal")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard engine")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a reproducible game")
+    args = parser.parse_args()
+    engine = BitboardGame2048 if args.bitboard else Game2048
+    curses.wrapper(play, lambda: engine(seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
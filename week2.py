@@ -1,5 +1,35 @@
+import argparse
+import heapq
+import itertools
+import os
+import random
 import re
+import sys
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from hashlib import blake2b
 
+from instrument import timed
+
+# Same rules as count_words, compiled once: the punctuation is deleted with
+# one translate table, and a word is a run of non-whitespace that has an
+# ASCII letter and neither starts nor ends with a digit.
+PUNCTUATION = '.,!?;:"()[]{}<>'
+STRIP_PUNCTUATION = str.maketrans('', '', PUNCTUATION)
+WORD = re.compile(r'(?<!\S)(?!\d)(?=\S*?[a-zA-Z])\S+(?<!\d)(?!\S)')
+# The streaming counter works on UTF-8 bytes: the punctuation is ASCII, so it
+# can be deleted before decoding, and a chunk is only ever cut at an ASCII
+# whitespace byte, which is never part of a multi-byte character.
+PUNCTUATION_BYTES = PUNCTUATION.encode()
+ASCII_WHITESPACE = [bytes([byte]) for byte in range(128) if chr(byte).isspace()]
+CHUNK_SIZE = 1 << 22  # bytes read at a time
+SPLIT_SIZE = 1 << 26  # bytes of input per task when counting in parallel
+SKETCH_WIDTH = 1 << 18
+BATCH_SIZE = 100000  # records per task for count_many
+
+@timed("week2.count_words")
 def count_words(text):
     #Function to take a string input and return the number of words.
     
@@ -24,8 +54,318 @@ def count_words(text):
     
     return len(filtered_words)
 
+def count_text(text):
+    # Fast equivalent of count_words
+    return len(WORD.findall(text.translate(STRIP_PUNCTUATION)))
+
+def count_batch(texts):
+    # count_text over a list of strings. The punctuation of the whole batch is
+    # removed in one translate call, joined with \x1f, a whitespace character
+    # that does not occur in ordinary text, and split apart again afterwards.
+    findall = WORD.findall
+    pieces = '\x1f'.join(texts).translate(STRIP_PUNCTUATION).split('\x1f')
+    if len(pieces) != len(texts):
+        # Some record contains \x1f itself
+        pieces = [text.translate(STRIP_PUNCTUATION) for text in texts]
+    return array('l', [len(findall(piece)) for piece in pieces])
+
+@timed("week2.count_many")
+def count_many(texts, workers=1, batch_size=BATCH_SIZE):
+    # Word counts of many short strings, e.g. titles or log lines, as an
+    # array('l') in input order. texts can be any iterable; it is consumed
+    # batch_size records at a time, and with workers > 1 the batches are
+    # counted on a process pool.
+    texts = iter(texts)
+    batches = iter(lambda: list(itertools.islice(texts, batch_size)), [])
+    counts = array('l')
+    if workers == 1:
+        for batch in batches:
+            counts.extend(count_batch(batch))
+        return counts
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        for batch_counts in pool.map(count_batch, batches):
+            counts.extend(batch_counts)
+    return counts
+
+def self_check(records=200000):
+    # Compares count_text and count_many with count_words on edge cases and
+    # random strings, and times them. Returns True when they all agree.
+    cases = ["", " ", "hello", "hello world", "Hello, world!", "a1", "1a", "a1b", "123", "(x)",
+             "x.1", "1.x", "[a] {b} <c>", "don't stop", "e-mail", "--", "é", "café", "٣a", "a٣",
+             "tab\tnew\nline", "a\x1cb", "a\x1fb c", "no\xa0break", "...", "hi...there", "word2 2word w2rd"]
+    rng = random.Random(2)
+    alphabet = "ab Z1٣é \t\n\xa0.,!?;:\"()[]{}<>-'"
+    cases += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(records)]
+    ok = True
+    start = time.perf_counter()
+    expected = [count_words(text) for text in cases]
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = count_many(cases)
+    batch_time = time.perf_counter() - start
+    for name, got in [("count_many", list(counts)), ("count_many (2 workers)", list(count_many(cases, 2, 5000))),
+                      ("count_text", [count_text(text) for text in cases])]:
+        if got != expected:
+            ok = False
+            text = next(text for text, a, b in zip(cases, expected, got) if a != b)
+            print(f"{name} disagrees with count_words on {text!r}")
+    print(f"{len(cases)} records: count_words {reference_time / len(cases) * 1e6:.2f} us/record, "
+          f"count_many {batch_time / len(cases) * 1e6:.2f} us/record")
+    print("All counts match." if ok else "Mismatches found.")
+    return ok
+
+def read_pieces(file, start=0, end=None, chunk_size=CHUNK_SIZE):
+    # Yields the text between byte offsets start and end (the end of the file
+    # when None) in decoded pieces with the punctuation removed. A piece never
+    # ends inside a word: a chunk is cut at its last ASCII whitespace byte and
+    # the rest is carried over to the next chunk.
+    if start:
+        file.seek(start)
+    remaining = None if end is None else end - start
+    carry = b''
+    while remaining is None or remaining > 0:
+        chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        data = carry + chunk.translate(None, PUNCTUATION_BYTES)
+        cut = max(data.rfind(space) for space in ASCII_WHITESPACE) + 1
+        carry = data[cut:]
+        yield data[:cut].decode('utf-8', 'replace')
+    yield carry.decode('utf-8', 'replace')
+
+@timed("week2.count_stream")
+def count_stream(file, chunk_size=CHUNK_SIZE):
+    # Counts the words of a binary file object in fixed size chunks, so memory
+    # use does not depend on the size of the input
+    return sum(len(WORD.findall(text)) for text in read_pieces(file, chunk_size=chunk_size))
+
+def count_file(path, chunk_size=CHUNK_SIZE):
+    # '-' is stdin
+    if path == '-':
+        return count_stream(sys.stdin.buffer, chunk_size)
+    with open(path, 'rb') as file:
+        return count_stream(file, chunk_size)
+
+class CountMinSketch:
+    # Approximate word counts in a fixed amount of memory. Every word adds to
+    # one counter in each row and its estimate is the smallest of those, which
+    # is never below the true count. Sketches of the same size can be added.
+    def __init__(self, width=SKETCH_WIDTH, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('Q', bytes(8 * width * depth))
+
+    def positions(self, word):
+        # Double hashing: row i uses h1 + i * h2 from one 64 bit digest
+        digest = int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), 'little')
+        h1, h2 = digest & 0xffffffff, (digest >> 32) | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, word, count=1):
+        # Returns the new estimate for word
+        table = self.table
+        estimate = None
+        for i in self.positions(word):
+            table[i] += count
+            if estimate is None or table[i] < estimate:
+                estimate = table[i]
+        return estimate
+
+    def estimate(self, word):
+        return min(self.table[i] for i in self.positions(word))
+
+    def merge(self, other):
+        self.table = array('Q', map(int.__add__, self.table, other.table))
+
+class TopK:
+    # The k words with the highest counts seen so far. The heap may hold stale
+    # (count, word) entries for words whose count went up; they are skipped.
+    def __init__(self, k):
+        self.k = k
+        self.counts = {}
+        self.heap = []
+
+    def offer(self, word, count):
+        if word not in self.counts and len(self.counts) >= self.k:
+            while self.heap[0][0] != self.counts.get(self.heap[0][1]):
+                heapq.heappop(self.heap)
+            if count <= self.heap[0][0]:
+                return
+            del self.counts[heapq.heappop(self.heap)[1]]
+        self.counts[word] = count
+        heapq.heappush(self.heap, (count, word))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(count, word) for word, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+class WordStats:
+    # Word counts of a set of byte ranges: the total, per file, and with top
+    # set the most frequent words, exactly with a Counter or, in bounded
+    # memory, from a count-min sketch plus a TopK of candidate words.
+    def __init__(self, top=0, exact=False, width=SKETCH_WIDTH):
+        self.top = top
+        self.words = 0
+        self.files = {}  # path -> words
+        self.counter = Counter() if top and exact else None
+        self.sketch = CountMinSketch(width) if top and not exact else None
+        self.candidates = TopK(top) if self.sketch else None
+
+    def add_text(self, path, text):
+        words = WORD.findall(text)
+        self.words += len(words)
+        self.files[path] = self.files.get(path, 0) + len(words)
+        if self.counter is not None:
+            self.counter.update(words)
+        elif self.sketch is not None:
+            for word, count in Counter(words).items():
+                self.candidates.offer(word, self.sketch.add(word, count))
+
+    def merge(self, other):
+        self.words += other.words
+        for path, count in other.files.items():
+            self.files[path] = self.files.get(path, 0) + count
+        if self.counter is not None:
+            self.counter.update(other.counter)
+        elif self.sketch is not None:
+            self.sketch.merge(other.sketch)
+            words = set(self.candidates.counts) | set(other.candidates.counts)
+            self.candidates = TopK(self.top)
+            for word in words:
+                self.candidates.offer(word, self.sketch.estimate(word))
+
+    def most_common(self):
+        # [(word, count)] with the highest counts first; estimates unless exact
+        if self.counter is not None:
+            return self.counter.most_common(self.top)
+        if self.sketch is None:
+            return []
+        counts = self.candidates.counts
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:self.top]
+
+def split_file(path, split_size=SPLIT_SIZE):
+    # (start, end) byte ranges of at most about split_size, each starting
+    # right after an ASCII whitespace byte so no word is cut in two
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as file:
+        while size - start > split_size:
+            file.seek(start + split_size)
+            end = None
+            while end is None:
+                block = file.read(1 << 16)
+                if not block:
+                    break
+                found = [i for i in (block.find(space) for space in ASCII_WHITESPACE) if i >= 0]
+                if found:
+                    end = file.tell() - len(block) + min(found) + 1
+            if end is None:
+                break
+            ranges.append((start, end))
+            start = end
+    ranges.append((start, size))
+    return ranges
+
+@timed("week2.count_ranges")
+def count_ranges(ranges, top=0, exact=False, width=SKETCH_WIDTH, chunk_size=CHUNK_SIZE):
+    # Runs in a worker process. ranges are (path, start, end), '-' is stdin
+    stats = WordStats(top, exact, width)
+    for path, start, end in ranges:
+        if path == '-':
+            for text in read_pieces(sys.stdin.buffer, chunk_size=chunk_size):
+                stats.add_text(path, text)
+            continue
+        with open(path, 'rb') as file:
+            for text in read_pieces(file, start, end, chunk_size):
+                stats.add_text(path, text)
+    return stats
+
+def list_files(paths):
+    # Files, with directories expanded recursively in sorted order
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+    return files
+
+@timed("week2.count_paths")
+def count_paths(paths, workers=1, top=0, exact=False, width=SKETCH_WIDTH,
+                split_size=SPLIT_SIZE, chunk_size=CHUNK_SIZE):
+    # Counts files and directories on a process pool. Big files are split into
+    # ranges, small ones grouped, so every task reads about split_size bytes.
+    # Returns a WordStats with all partial results merged.
+    tasks = []
+    task = []
+    task_bytes = 0
+    for path in list_files(paths):
+        if path == '-':
+            tasks.append([(path, 0, None)])
+            continue
+        for start, end in split_file(path, split_size):
+            if task and task_bytes + end - start > split_size:
+                tasks.append(task)
+                task, task_bytes = [], 0
+            task.append((path, start, end))
+            task_bytes += end - start
+    if task:
+        tasks.append(task)
+
+    stats = WordStats(top, exact, width)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            stats.merge(count_ranges(task, top, exact, width, chunk_size))
+        return stats
+    # stdin cannot be handed to another process, it is read here meanwhile
+    local = [task for task in tasks if task[0][0] == '-']
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(count_ranges, task, top, exact, width, chunk_size)
+                   for task in tasks if task[0][0] != '-']
+        for task in local:
+            stats.merge(count_ranges(task, top, exact, width, chunk_size))
+        for future in as_completed(futures):
+            stats.merge(future.result())
+    return stats
+
 def main():
     # Main function handles user input and displays the word count.
+    parser = argparse.ArgumentParser(description="Count the words in text")
+    parser.add_argument("files", nargs="*", help="files to count, - for stdin; without files the text is asked for")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes read at a time")
+    parser.add_argument("--workers", type=int, default=1, help="processes to count with, 0 for one per CPU")
+    parser.add_argument("--split-size", type=int, default=SPLIT_SIZE, help="bytes of input per parallel task")
+    parser.add_argument("--top", type=int, default=0, help="also list the most frequent words")
+    parser.add_argument("--exact", action="store_true", help="count every distinct word exactly for --top "
+                                                              "instead of estimating in bounded memory")
+    parser.add_argument("--sketch-width", type=int, default=SKETCH_WIDTH, help="counters per sketch row")
+    parser.add_argument("--check", action="store_true", help="check the fast counters against count_words")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if self_check() else 1)
+    if args.files:
+        files = []
+        for path in list_files(args.files):
+            if path == '-' or os.access(path, os.R_OK):
+                files.append(path)
+            else:
+                print(f"Error! Could not read {path}")
+        stats = count_paths(files, args.workers, args.top, args.exact, args.sketch_width,
+                            args.split_size, args.chunk_size)
+        for path in files:
+            print(f"{stats.files.get(path, 0):>12} {path}")
+        if len(files) > 1:
+            print(f"{stats.words:>12} total")
+        if args.top:
+            print(f"Most frequent words{'' if args.exact else ' (estimated)'}:")
+            for word, count in stats.most_common():
+                print(f"{count:>12} {word}")
+        return
  
     # Prompt the user to give input
     user_input = input("Please enter a sentence or paragraph: ").strip()
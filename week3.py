@@ -1,46 +1,121 @@
+import argparse
 import csv
 import os
 from datetime import datetime
 
+from expense_import import import_csv
+from expense_index import ExpenseIndex, ExpenseRollups
+from expense_storage import make_storage
+from instrument import timed
+
 class ExpenseTracker:
-    def __init__(self, data_file, category_file, currency_file):
+    def __init__(self, data_file, category_file, currency_file, storage="csv", interactive=True, cache=True):
         self.data_file = data_file
         self.category_file = category_file
         self.currency_file = currency_file
+        # "csv" rewrites the whole file on every change, "journal" appends records,
+        # "sqlite" keeps everything in an indexed database next to the CSV
+        # With cache=False nothing is written next to the ledger: no CSV
+        # snapshot, rollups, journal or database. Caches already there are used.
+        self.cache = cache
+        if isinstance(storage, str):
+            storage = make_storage(storage, data_file, category_file, currency_file, read_only=not cache)
+        self.storage = storage
+        # Without interactive nothing is asked with input(): a missing currency
+        # defaults to USD and missing categories are taken from the expenses
+        self.interactive = interactive
         self.expenses = []
+        self.index = None
+        self.rollups = None
+        # Per-month totals are saved next to the file the backend keeps the ledger in
+        self.rollup_file = storage.path + ".rollups.json"
+        self.next_id = 1
         self.categories = []
         self.currency = self.load_or_set_currency()
         self.load_data()
         self.load_categories()
     
+    @timed("ExpenseTracker.load_data")
     def load_data(self):
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as file:
-                reader = csv.DictReader(file)
-                self.expenses = [row for row in reader]
+        self.expenses = self.storage.load()
+        if hasattr(self.expenses, 'max_id'):
+            # Loaded from a snapshot, which already knows the ids and has the index built
+            self.next_id = self.expenses.max_id + 1
+        elif self.expenses:
+            self.next_id = max(int(expense['id']) for expense in self.expenses) + 1
+        # Backends that can summarize themselves don't need the in-memory index
+        if not hasattr(self.storage, 'summarize'):
+            if hasattr(self.expenses, 'build_index'):
+                self.index = self.expenses.build_index()
+            else:
+                self.index = ExpenseIndex(self.expenses)
+        self.rollups = ExpenseRollups.load(self.rollup_file, self.rollup_stamp())
+        if self.rollups is None:
+            self.rebuild_rollups()
     
+    @timed("ExpenseTracker.save_data")
     def save_data(self):
-        with open(self.data_file, 'w', newline='') as file:
-            fieldnames = ['amount', 'description', 'category', 'date']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.expenses)
+        self.storage.save(self.expenses)
+        self.save_rollups()
+
+    def rollup_stamp(self):
+        # Every add or delete changes the count or the next id; the size and
+        # modification time of the ledger file catch edits made outside the tracker
+        try:
+            stat = os.stat(self.storage.path)
+            file_stamp = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            file_stamp = None
+        return [len(self.expenses), self.next_id, file_stamp]
+
+    def save_rollups(self):
+        if self.cache:
+            self.rollups.save(self.rollup_file, self.rollup_stamp())
+
+    def rebuild_rollups(self):
+        self.rollups = ExpenseRollups.build(self.expenses)
+        self.save_rollups()
+
+    def close(self):
+        # The backend may still write the ledger file when closing, stamp it after that
+        self.storage.close()
+        self.save_rollups()
     
     def load_categories(self):
-        if os.path.exists(self.category_file):
+        if hasattr(self.storage, 'load_categories'):
+            self.categories = self.storage.load_categories()
+            if not self.categories:
+                self.setup_categories()
+        elif os.path.exists(self.category_file):
             with open(self.category_file, 'r') as file:
                 reader = csv.reader(file)
                 self.categories = [row[0] for row in reader]
         else:
             self.setup_categories()
+
+    def categories_from_expenses(self):
+        categories = []
+        seen = set()
+        for expense in self.expenses:
+            category = expense.get('category')
+            if category and category.lower() not in seen:
+                seen.add(category.lower())
+                categories.append(category)
+        return categories
     
     def save_categories(self):
+        if hasattr(self.storage, 'save_categories'):
+            self.storage.save_categories(self.categories)
+            return
         with open(self.category_file, 'w', newline='') as file:
             writer = csv.writer(file)
             for category in self.categories:
                 writer.writerow([category])
     
     def setup_categories(self):
+        if not self.interactive:
+            self.categories = self.categories_from_expenses()
+            return
         print("Please set up your expense categories :)")
         while True:
             category = input("Enter a category (or type 'done' to finish): ").strip()
@@ -51,6 +126,8 @@ class ExpenseTracker:
         self.save_categories()
     
     def load_or_set_currency(self):
+        if hasattr(self.storage, 'load_currency'):
+            return self.storage.load_currency() or self.set_currency()
         if os.path.exists(self.currency_file):
             with open(self.currency_file, 'r') as file:
                 return file.read().strip()
@@ -58,10 +135,15 @@ class ExpenseTracker:
             return self.set_currency()
     
     def save_currency(self):
+        if hasattr(self.storage, 'save_currency'):
+            self.storage.save_currency(self.currency)
+            return
         with open(self.currency_file, 'w') as file:
             file.write(self.currency)
     
     def set_currency(self):
+        if not self.interactive:
+            return "USD"
         print("Please set the currency type (e.g., USD, EUR, GBP).")
         currency = input("Enter currency: ").strip().upper()
         if currency:
@@ -96,78 +178,111 @@ class ExpenseTracker:
             'amount': amount,
             'description': description,
             'category': category,
-            'date': date
+            'date': date,
+            'id': str(self.next_id)
         }
+        self.next_id += 1
         self.expenses.append(expense)
-        self.save_data()
+        if self.index is not None:
+            self.index.add(expense)
+        self.rollups.add(expense)
+        self.storage.add(expense, self.expenses)
     
+    def add_expenses(self, expenses):
+        # Bulk add of already validated expenses, written to storage in one batch
+        if not expenses:
+            return
+        for expense in expenses:
+            expense['id'] = str(self.next_id)
+            self.next_id += 1
+            self.rollups.add(expense)
+        self.expenses.extend(expenses)
+        if self.index is not None:
+            self.index.add_many(expenses)
+        self.storage.add_many(expenses, self.expenses)
+
+    def import_csv(self, path, rejects_file=None, **options):
+        # See expense_import.import_csv for the options
+        imported, rejected = import_csv(self, path, rejects_file, **options)
+        self.save_rollups()
+        return imported, rejected
+
     def delete_expense(self, index):
         if 0 <= index < len(self.expenses):
-            del self.expenses[index]
-            self.save_data()
+            expense = self.expenses.pop(index)
+            if self.index is not None:
+                self.index.remove(expense)
+            self.rollups.remove(expense)
+            self.storage.delete(expense, self.expenses)
             print("Expense deleted successfully.")
         else:
             print("Invalid index. Please try again.")
     
+    def summarize(self, start_date=None, end_date=None):
+        # Structured summary of a date range (or everything) without printing
+        summarizer = self.index if self.index is not None else self.storage
+        summary = summarizer.summarize(start_date, end_date)
+        summary["currency"] = self.currency
+        return summary
+
+    @timed("ExpenseTracker.get_summary")
     def get_summary(self, start_date=None, end_date=None):
+        # Prints the summary and returns it, see expense_index.make_summary for the format
         if not self.expenses:
             print("No entries found.")
             return
         
-        filtered_expenses = self.expenses
-        if start_date and end_date:
-            filtered_expenses = [
-                expense for expense in self.expenses
-                if 'date' in expense and start_date <= datetime.strptime(expense['date'], '%d-%m-%Y') <= end_date
-            ]
-
-        total_expense = sum(float(expense['amount']) for expense in filtered_expenses)
-        
-        if not filtered_expenses:
+        summary = self.summarize(start_date, end_date)
+        if not summary["count"]:
             print("No entries found in the specified period.")
             return
-        
-        category_summary = {}
+        self.print_summary(summary)
+        return summary
 
-        for expense in filtered_expenses:
-            category = expense['category']
-            amount = float(expense['amount'])
-            if category in category_summary:
-                category_summary[category] += amount
-            else:
-                category_summary[category] = amount
-
-        print(f"Total Expense: {self.currency} {total_expense:.2f}")
+    def print_summary(self, summary):
+        print(f"Total Expense: {self.currency} {summary['total']:.2f}")
         print("Category-wise Breakdown:")
-        for category, amount in category_summary.items():
-            print(f"  {category}: {self.currency} {amount:.2f}")
+        for category, values in summary["categories"].items():
+            print(f"  {category}: {self.currency} {values['total']:.2f}")
+
+    @timed("ExpenseTracker.get_period_summary")
+    def get_period_summary(self, year, month=None):
+        # Structured summary of one month, or a whole year, straight from the rollups
+        summary = self.rollups.summarize(year, month)
+        summary["year"] = year
+        summary["month"] = month
+        summary["currency"] = self.currency
+        return summary
 
     def get_monthly_summary(self, year, month):
         if not self.expenses:
             print("No entries found.")
             return
         
-        try:
-            start_date = datetime.strptime(f'01-{month:02d}-{year}', '%d-%m-%Y')
-            if month == 12:
-                end_date = datetime.strptime(f'01-01-{year + 1}', '%d-%m-%Y')
-            else:
-                end_date = datetime.strptime(f'01-{month + 1:02d}-{year}', '%d-%m-%Y')
-            self.get_summary(start_date, end_date)
-        except ValueError:
+        if not (1 <= month <= 12 and 1 <= year <= 9999):
             print("Invalid month or year. Please enter a valid month (1-12) and a valid year.")
+            return
+        summary = self.get_period_summary(year, month)
+        if not summary["count"]:
+            print("No entries found in the specified period.")
+            return
+        self.print_summary(summary)
+        return summary
 
     def get_yearly_summary(self, year):
         if not self.expenses:
             print("No entries found.")
             return
         
-        try:
-            start_date = datetime.strptime(f'01-01-{year}', '%d-%m-%Y')
-            end_date = datetime.strptime(f'01-01-{year + 1}', '%d-%m-%Y')
-            self.get_summary(start_date, end_date)
-        except ValueError:
+        if not 1 <= year <= 9999:
             print("Invalid year. Please enter a valid year.")
+            return
+        summary = self.get_period_summary(year)
+        if not summary["count"]:
+            print("No entries found in the specified period.")
+            return
+        self.print_summary(summary)
+        return summary
 
     def get_custom_summary(self):
         if not self.expenses:
@@ -187,7 +302,7 @@ class ExpenseTracker:
             except ValueError:
                 print("Invalid date format. Please enter dates in DD-MM-YYYY format.")
         
-        self.get_summary(start_date, end_date)
+        return self.get_summary(start_date, end_date)
 
     def manage_categories(self):
         while True:
@@ -229,7 +344,36 @@ class ExpenseTracker:
                 print("Invalid choice. Please try again.")
 
 def main():
-    tracker = ExpenseTracker('expenses.csv', 'categories.csv', 'currency.txt')
+    parser = argparse.ArgumentParser(description="Expense tracker")
+    parser.add_argument("--storage", choices=["csv", "journal", "sqlite"], default="csv",
+                        help="journal appends each change instead of rewriting the CSV, "
+                             "sqlite moves the ledger into an indexed database")
+    commands = parser.add_subparsers(dest="command")
+    importer = commands.add_parser("import", help="bulk import expenses from a CSV file")
+    importer.add_argument("file")
+    importer.add_argument("--rejects", default="rejects.csv", help="where to write rows that failed validation")
+    importer.add_argument("--workers", type=int, default=1, help="processes used for parsing")
+    importer.add_argument("--chunk-size", type=int, default=50000, help="rows parsed and written per batch")
+    importer.add_argument("--date-format", default="%d-%m-%Y", help="strptime format of the date column")
+    for column in ("date", "amount", "category", "description"):
+        importer.add_argument(f"--{column}-column", default=column, help=f"name of the {column} column")
+    args = parser.parse_args()
+    tracker = ExpenseTracker('expenses.csv', 'categories.csv', 'currency.txt', storage=args.storage)
+
+    if args.command == "import":
+        columns = {column: getattr(args, f"{column}_column") for column in ("date", "amount", "category", "description")}
+        try:
+            imported, rejected = tracker.import_csv(args.file, args.rejects, columns=columns,
+                                                    date_format=args.date_format,
+                                                    chunk_size=args.chunk_size, workers=args.workers)
+        except ValueError as error:
+            print(f"Error: {error}")
+        else:
+            print(f"Imported {imported} expenses.")
+            if rejected:
+                print(f"{rejected} rows were rejected, see {args.rejects}.")
+        tracker.close()
+        return
 
     while True:
         print("1. Add Expense")
@@ -310,6 +454,7 @@ def main():
         elif choice == '5':
             tracker.set_currency()
         elif choice == '6':
+            tracker.close()
             break
         else:
             print("Invalid choice. Please try again.")
@@ -1,26 +1,138 @@
-import random
+import argparse
+import os
+import re
+import secrets
 import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def generate_password(length):
+from breach_filter import BreachFilter, open_filter
+from instrument import timed
 
-    # Create character sets
-    upper = string.ascii_uppercase
-    lower = string.ascii_lowercase
-    digits = string.digits
-    spl = "-!@#$%^&*+"
+# Character sets
+UPPER = string.ascii_uppercase
+LOWER = string.ascii_lowercase
+DIGITS = string.digits
+SPECIAL = "-!@#$%^&*+"
+CHARACTERS = UPPER + LOWER + DIGITS + SPECIAL
 
-    # Ensure at least one character from each set is included
-    password = [random.choice(upper), random.choice(lower), random.choice(digits), random.choice(spl)]
+# Bulk mode maps random bytes straight to characters: a byte below 216
+# (3 * 72) becomes CHARACTERS[byte % 72] and the bytes from 216 up are
+# deleted, so every character is equally likely.
+ACCEPTED_BYTES = 256 - 256 % len(CHARACTERS)
+BYTE_TO_CHARACTER = bytes(ord(CHARACTERS[byte % len(CHARACTERS)]) for byte in range(256))
+REJECTED_BYTES = bytes(range(ACCEPTED_BYTES, 256))
+HAS_EVERY_CLASS = re.compile(("".join(f"(?=[^{chars}]*[{chars}])" for chars in (
+    "A-Z", "a-z", "0-9", re.escape(SPECIAL)))).encode())
+BATCH_SIZE = 100000  # passwords per batch in bulk mode
 
-    # Fill the rest of the password length with random choices from all sets
-    characters = upper + lower + digits + spl
-    password += random.choices(characters, k=length-4)
+system_random = secrets.SystemRandom()
 
-    # Shuffle the list to ensure randomness and convert to a string
-    random.shuffle(password)
-    return ''.join(password)
+@timed("week4.generate_password")
+def generate_password(length, breach_filter=None):
+    # breach_filter is an optional breach_filter.BreachFilter; passwords found
+    # in it are thrown away and generated again
+    while True:
+        # Ensure at least one character from each set is included
+        password = [secrets.choice(UPPER), secrets.choice(LOWER), secrets.choice(DIGITS), secrets.choice(SPECIAL)]
+
+        # Fill the rest of the password length with random choices from all sets
+        password += [secrets.choice(CHARACTERS) for _ in range(length - 4)]
+
+        # Shuffle the list to ensure randomness and convert to a string
+        system_random.shuffle(password)
+        password = ''.join(password)
+        if breach_filter is None or password not in breach_filter:
+            return password
+
+@timed("week4.generate_batch")
+def generate_batch(count, length, filter_path=None):
+    # count passwords as bytes. Candidates are cut from one large os.urandom
+    # buffer and the ones missing a character class are thrown away, which
+    # keeps every valid password equally likely. With filter_path, candidates
+    # in that breach filter are thrown away too.
+    # Returns (passwords, number of breached candidates).
+    passwords = []
+    breached = 0
+    match = HAS_EVERY_CLASS.match
+    breach_filter = open_filter(filter_path) if filter_path else None
+    while len(passwords) < count:
+        needed = (count - len(passwords)) * length
+        # At most 1 MiB at a time, unless one password alone needs more: 216
+        # of every 256 bytes are kept, so 2 * length bytes hold about 1.7 passwords
+        size = min(3 * needed + 64, max(1 << 20, 2 * length + 64))
+        chars = os.urandom(size).translate(BYTE_TO_CHARACTER, REJECTED_BYTES)
+        for i in range(0, len(chars) - length + 1, length):
+            if match(chars, i, i + length):
+                password = chars[i:i + length]
+                if breach_filter is not None and password in breach_filter:
+                    breached += 1
+                    continue
+                passwords.append(password)
+    del passwords[count:]
+    return passwords, breached
+
+def generate_block(count, length, filter_path=None):
+    # One batch as newline terminated lines, ready to be written out
+    passwords, breached = generate_batch(count, length, filter_path)
+    return b"\n".join(passwords) + b"\n", breached
+
+def generate_bulk(count, length, out, workers=1, batch_size=BATCH_SIZE, filter_path=None):
+    # Writes count passwords to the binary file out, generated in batches on
+    # workers processes. Returns (seconds it took, breached candidates skipped).
+    start = time.perf_counter()
+    batches = [batch_size] * (count // batch_size)
+    if count % batch_size:
+        batches.append(count % batch_size)
+    breached = 0
+    if workers == 1:
+        blocks = (generate_block(batch, length, filter_path) for batch in batches)
+        for block, skipped in blocks:
+            out.write(block)
+            breached += skipped
+    else:
+        with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            blocks = pool.map(generate_block, batches, [length] * len(batches), [filter_path] * len(batches))
+            for block, skipped in blocks:
+                out.write(block)
+                breached += skipped
+    out.flush()
+    return time.perf_counter() - start, breached
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate strong passwords")
+    parser.add_argument("--bulk", type=int, metavar="COUNT", help="generate COUNT passwords without prompting")
+    parser.add_argument("--length", type=int, default=16, help="password length in bulk mode")
+    parser.add_argument("--out", help="file for the bulk passwords, stdout by default")
+    parser.add_argument("--workers", type=int, default=1, help="processes to generate with, 0 for one per CPU")
+    parser.add_argument("--breach-filter", help="skip passwords found in this filter (see breach_filter.py)")
+    args = parser.parse_args()
+    breach_filter = None
+    if args.breach_filter:
+        try:
+            breach_filter = BreachFilter(args.breach_filter)
+        except (OSError, ValueError) as error:
+            print(f"Error: {error}", file=sys.stderr)
+            return
+    if args.bulk is not None:
+        if args.length < 8:
+            print("Error: Password length should be at least 8", file=sys.stderr)
+            return
+        if args.out:
+            with open(args.out, 'wb') as out:
+                seconds, breached = generate_bulk(args.bulk, args.length, out, args.workers,
+                                                  filter_path=args.breach_filter)
+        else:
+            seconds, breached = generate_bulk(args.bulk, args.length, sys.stdout.buffer, args.workers,
+                                              filter_path=args.breach_filter)
+        # stdout may be the passwords, so the report goes to stderr
+        print(f"{args.bulk} passwords in {seconds:.2f}s ({args.bulk / max(seconds, 1e-9):,.0f} passwords/sec)",
+              file=sys.stderr)
+        if breach_filter is not None:
+            print(f"{breached} breached candidates skipped", file=sys.stderr)
+        return
+
     try:
         print("Welcome to the Password Generator :)")
         length = int(input("Enter the required password length: "))
@@ -30,7 +142,9 @@ def main():
         count = int(input("Enter the number of passwords to be generated: "))
 
         for i in range(count):
-            print(f"Password {i+1}: {generate_password(length)}")
+            print(f"Password {i+1}: {generate_password(length, breach_filter)}")
+        if breach_filter is not None:
+            print(f"{breach_filter.hits} breached candidates skipped in {breach_filter.lookups} checks")
     
     except ValueError as ve:
         print(f"Error: {ve}")